@@ -29,7 +29,10 @@ import sys
 import threading
 import queue
 import math
-from typing import Optional, Dict, Any, List, Tuple
+import functools
+from collections import OrderedDict, deque
+from operator import itemgetter
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable
 from dataclasses import dataclass, field
 from enum import Enum, auto
 
@@ -37,7 +40,12 @@ import time
 import pygame
 import esper
 
-from src.client.ui import (UIManager, Button, Label, TextInput, CONFIRM_BUTTON_COLOR, CONFIRM_BUTTON_HOVER_COLOR,
+try:
+    import orjson # Необязательная зависимость: быстрее разбирает большие FULL_STATE_UPDATE
+except ImportError:
+    orjson = None
+
+from src.client.ui import (UIManager, Button, Label, TextInput, BUTTON_TEXT_COLOR, CONFIRM_BUTTON_COLOR, CONFIRM_BUTTON_HOVER_COLOR,
                            CONFIRM_BUTTON_PRESSED_COLOR, CONFIRM_BUTTON_TEXT_COLOR, TURN_INDICATOR_PLAYER_COLOR, TURN_INDICATOR_OPPONENT_COLOR, MENU_BUTTON_BG, MENU_BUTTON_HOVER, MENU_BUTTON_PRESSED, MENU_BUTTON_TEXT)
 
 # --- Константы ---
@@ -73,6 +81,9 @@ PLAY_AREA_X_START = 240 # Отступ слева для индикаторов,
 RIGHT_MARGIN = 40
 PLAY_AREA_WIDTH = SCREEN_WIDTH - PLAY_AREA_X_START - RIGHT_MARGIN
 
+# Зоны раскладки карт, которые LayoutSystem пересчитывает только по необходимости
+LAYOUT_ZONES = ("my_hand", "my_board", "opp_hand", "opp_board")
+
 # --- Константы ---
 # --- Card Visuals ---
 ASSETS = {} # Словарь для хранения загруженных изображений
@@ -94,6 +105,7 @@ MANA_SECTOR_COLORS = { # Transparent colors for pentagon sectors
     'R': (237, 187, 153, 150),
     'G': (169, 204, 164, 150),
 }
+MANA_COUNT_OUTLINE_COLOR = (20, 20, 30)
 MANA_SYMBOL_TEXT_COLOR = (10, 10, 10)
 STATS_BG_COLOR = (210, 210, 220) # Светлый фон для характеристик
 STATS_TEXT_COLOR = (10, 10, 20) # Темный текст для характеристик
@@ -111,13 +123,29 @@ ATTACK_READY_COLOR = (0, 255, 0)
 
 # --- Компоненты (Components) ---
 BROADCAST_PORT = 8889
-
-def get_player_indicator_rect(client_state: "ClientState", player_id: int) -> Optional[pygame.Rect]:
-    """Возвращает Rect для индикатора игрока (пентагона)."""
-    if not client_state.game_state_dict or client_state.my_player_id is None:
-        return None
-
-    is_my_player = (player_id == client_state.my_player_id)
+# Сервер рассылает broadcast каждые 5 секунд, поэтому "серверы не найдены" показываем
+# чуть позже двух циклов.
+SERVER_SEARCH_TIMEOUT = 11.0 # seconds
+# Сколько отрисованных надписей RenderSystem держит в кэше
+TEXT_CACHE_SIZE = 512
+# Размер блока, которым NetworkThread читает из сокета
+NETWORK_READ_SIZE = 65536
+# Сколько слоев "стопки" рисуется под верхней картой кладбища
+GRAVEYARD_PILE_LAYERS = 3
+# События, которые клиент не обрабатывает: SDL не кладет их в очередь вовсе.
+# MOUSEMOTION не нужен - наведение опрашивается по pygame.mouse.get_pos() раз в кадр.
+# TEXTINPUT, TEXTEDITING и KEYUP блокировать нельзя: pygame берет из TEXTINPUT значение
+# KEYDOWN.unicode (кириллица, IME, Shift), а по KEYUP освобождает сохраненные символы.
+BLOCKED_EVENT_TYPES = [
+    pygame.MOUSEMOTION, pygame.MOUSEWHEEL,
+    pygame.JOYAXISMOTION, pygame.JOYBALLMOTION, pygame.JOYHATMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP,
+    pygame.CONTROLLERAXISMOTION, pygame.CONTROLLERBUTTONDOWN, pygame.CONTROLLERBUTTONUP,
+    pygame.FINGERMOTION, pygame.FINGERDOWN, pygame.FINGERUP, pygame.MULTIGESTURE,
+]
+
+@functools.lru_cache(maxsize=None)
+def _player_indicator_rect(is_my_player: bool) -> pygame.Rect:
+    """Rect пентагона зависит только от стороны стола, поэтому считается один раз на сторону."""
     size = MANA_PENTAGON_SIZE
     radius = size // 2
 
@@ -131,6 +159,137 @@ def get_player_indicator_rect(client_state: "ClientState", player_id: int) -> Op
     # Возвращаем квадратный Rect, описывающий пентагон
     return pygame.Rect(center_x - radius, center_y - radius, size, size)
 
+def get_player_indicator_rect(client_state: "ClientState", player_id: int) -> Optional[pygame.Rect]:
+    """Возвращает Rect для индикатора игрока (пентагона).
+
+    Rect общий для всех вызовов, изменять его нельзя (при необходимости - .copy()).
+    """
+    if not client_state.game_state_dict or client_state.my_player_id is None:
+        return None
+
+    return _player_indicator_rect(player_id == client_state.my_player_id)
+
+@dataclass(frozen=True)
+class PentagonGeometry:
+    """Заранее вычисленные точки индикатора маны и здоровья одного игрока."""
+    center: Tuple[int, int]
+    vertices: Tuple[Tuple[float, float], ...]
+    midpoints: Tuple[Tuple[float, float], ...]
+    sectors: Tuple[Tuple[str, Tuple[Tuple[float, float], ...]], ...] # (цвет маны, точки сектора)
+    mana_slots: Tuple[Tuple[str, Tuple[float, float], Tuple[float, float]], ...] # (цвет маны, символ, счетчик)
+    health_radius: float
+
+def _build_pentagon_geometry(center_x: int, center_y: int) -> PentagonGeometry:
+    """Вычисляет вершины, секторы и позиции надписей пентагона с центром в (center_x, center_y)."""
+    radius = MANA_PENTAGON_SIZE // 2
+    center_point = (center_x, center_y)
+
+    vertices = []
+    for i in range(5):
+        angle_rad = math.radians(-90 + 72 * i)
+        vertices.append((center_x + radius * math.cos(angle_rad), center_y + radius * math.sin(angle_rad)))
+
+    midpoints = []
+    for i in range(5):
+        p1 = vertices[i]
+        p2 = vertices[(i + 1) % 5]
+        midpoints.append(((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2))
+
+    mana_order = ['W', 'U', 'B', 'R', 'G']
+    sectors = tuple(
+        (color_char, (center_point, midpoints[(i - 1 + 5) % 5], vertices[i], midpoints[i]))
+        for i, color_char in enumerate(mana_order))
+
+    symbol_radius_factor = 0.72  # Further from center
+    count_radius_factor = 0.45  # Closer to center
+    mana_angles = [-90, -18, 54, 126, 198] # Angles for W, U, B, R, G
+    mana_slots = []
+    for color_char, angle in zip(mana_order, mana_angles):
+        cos_a, sin_a = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        symbol_pos = (center_x + radius * symbol_radius_factor * cos_a, center_y + radius * symbol_radius_factor * sin_a)
+        count_pos = (center_x + radius * count_radius_factor * cos_a, center_y + radius * count_radius_factor * sin_a)
+        mana_slots.append((color_char, symbol_pos, count_pos))
+
+    return PentagonGeometry(center_point, tuple(vertices), tuple(midpoints), sectors, tuple(mana_slots), radius * 0.3)
+
+def _deck_pile_rect(indicator_center: Tuple[int, int], is_my_player: bool) -> pygame.Rect:
+    """Rect стопки колоды: справа от кладбища, которое стоит над/под индикатором игрока."""
+    radius = MANA_PENTAGON_SIZE // 2
+    center_x, center_y = indicator_center
+    graveyard_card_right_edge = center_x + CARD_WIDTH // 2
+    deck_x = graveyard_card_right_edge + CARD_SPACING_X
+
+    if is_my_player:
+        deck_y = center_y - radius + MANA_PENTAGON_SIZE + Y_MARGIN
+    else:
+        deck_y = center_y - radius - Y_MARGIN - CARD_HEIGHT
+
+    return pygame.Rect(deck_x, deck_y, CARD_WIDTH, CARD_HEIGHT)
+
+def _make_pile_surface(layers: int, is_my_player: bool) -> pygame.Surface:
+    """Рисует слои стопки кладбища (каждый сдвинут на 2px) на прозрачной поверхности.
+
+    Поверхность шире и выше карты на GRAVEYARD_PILE_LAYERS * 2: у своей стопки слои уходят
+    влево-вверх, у стопки оппонента - влево-вниз.
+    """
+    margin = GRAVEYARD_PILE_LAYERS * 2
+    surf = pygame.Surface((CARD_WIDTH + margin, CARD_HEIGHT + margin), pygame.SRCALPHA)
+    for i in range(layers, 0, -1):
+        offset = i * 2
+        y = margin - offset if is_my_player else offset
+        pile_rect = pygame.Rect(margin - offset, y, CARD_WIDTH, CARD_HEIGHT)
+        pygame.draw.rect(surf, (20, 20, 25), pile_rect, 0, border_radius=8)
+        pygame.draw.rect(surf, (80, 80, 90), pile_rect, 1, border_radius=8)
+    return surf
+
+def _open_server_browser(client_state: "ClientState"):
+    """Колбэк кнопки "Присоединиться к игре"."""
+    client_state.game_phase = "SERVER_BROWSER"
+
+def _request_quit(client_state: "ClientState"):
+    """Колбэк кнопки "Выход": главный цикл завершается по этому специальному ID."""
+    client_state.my_player_id = -999
+
+def _drain_queue(q) -> list:
+    """Забирает все накопленные элементы очереди одним списком.
+
+    У queue.Queue содержимое снимается целиком под ее блокировкой - один захват
+    вместо захвата на каждый get_nowait. Очереди без mutex вычерпываются по одному.
+    """
+    mutex = getattr(q, "mutex", None)
+    if mutex is None:
+        items = []
+        try:
+            while True:
+                items.append(q.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+    with mutex:
+        if not q.queue:
+            return []
+        items = list(q.queue)
+        q.queue.clear()
+        q.not_full.notify_all()
+    return items
+
+def _clear_queue(q):
+    """Опустошает очередь. queue.Queue чистится целиком под ее собственной блокировкой,
+    у SimpleQueue такой блокировки нет - ее вычерпываем до queue.Empty."""
+    mutex = getattr(q, "mutex", None)
+    if mutex is None:
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        return
+    with mutex:
+        q.queue.clear()
+        q.unfinished_tasks = 0
+        q.all_tasks_done.notify_all()
+        q.not_full.notify_all()
+
 
 class GamePhase(Enum):
     """Определяет текущую фазу хода игрока, следуя логике MTG."""
@@ -156,29 +315,51 @@ class ClientState:
     game_over: bool = False
     winner_id: Optional[int] = None
     player_connection_status: Dict[int, str] = field(default_factory=dict)
+    opponent_id: Optional[int] = None # Кэш ID оппонента, обновляется при изменении player_connection_status
+    opponent_disconnected: bool = False # Кэш: оппонент в статусе DISCONNECTED
     # --- Состояние боя в стиле MTG ---
     phase: GamePhase = GamePhase.MAIN_1
     attackers: List[int] = field(default_factory=list)  # Атакующие, подтвержденные сервером (для защитника)
-    pending_attackers: List[int] = field(default_factory=list)  # Атакующие, выбираемые активным игроком
+    pending_attackers: Set[int] = field(default_factory=set)  # Атакующие, выбираемые активным игроком
     selected_blocker: Optional[int] = None
-    pending_put_bottom_cards: List[int] = field(default_factory=list)
+    # Упорядоченное множество (dict без значений): проверка "in" за O(1) на каждом кадре отрисовки,
+    # а порядок выбора сохраняется — в этом порядке сервер кладет карты под низ колоды.
+    pending_put_bottom_cards: Dict[int, None] = field(default_factory=dict)
     block_assignments: Dict[int, int] = field(default_factory=dict) # {blocker_id: attacker_id}
+    # --- Layout ---
+    layout_dirty: Set[str] = field(default_factory=lambda: set(LAYOUT_ZONES)) # Зоны, требующие пересчета позиций
+    positions_dirty: bool = False # Хотя бы одна Position изменилась в этом кадре
+    # Растет каждый раз, когда SyncSpriteRectSystem сдвигает rect карт. Системы, кэширующие
+    # что-то по положению карт (сетка попаданий, порядок отрисовки), сравнивают его со своим.
+    positions_version: int = 0
+    dirty: bool = True # Состояние изменилось с последней отрисовки, кадр нужно перерисовать
+    # Снимок рисуемых карт на текущий кадр: [(entity, sprite.rect, Drawable, Position)].
+    # Собирается один раз в InputSystem и переиспользуется для наведения, кликов и отрисовки.
+    frame_cards: List[Tuple[int, pygame.Rect, "Drawable", "Position"]] = field(default_factory=list)
     # --- Animation State ---
     animation_queue: List[Dict] = field(default_factory=list)
     current_animation: Optional[Dict] = None
     animation_timer: float = 0.0
     # --- Event Log ---
-    log_messages: List[str] = field(default_factory=list)
+    log_messages: "deque[str]" = field(default_factory=lambda: deque(maxlen=LOG_LINES)) # Старые строки вытесняются сами
     max_log_messages: int = LOG_LINES
+    log_dirty: bool = True # log_messages изменился, поверхность лога нужно перерисовать
     chat_messages: List[Dict] = field(default_factory=list)
     max_chat_messages: int = 10
 
-@dataclass
+# Горячие компоненты объявлены со __slots__: атрибуты хранятся в фиксированных
+# слотах объекта, а не в __dict__, и чтение pos.x в циклах раскладки и отрисовки дешевле.
+@dataclass(slots=True)
 class Position:
     x: float
     y: float
 
-@dataclass
+    @property
+    def center(self) -> Tuple[float, float]:
+        """Центр карты, чей левый верхний угол находится в этой позиции."""
+        return (self.x + CARD_WIDTH / 2, self.y + CARD_HEIGHT / 2)
+
+@dataclass(slots=True)
 class Drawable:
     sprite: pygame.sprite.Sprite
 
@@ -188,6 +369,11 @@ class Clickable:
     pass
 
 @dataclass
+class Dirty:
+    """Маркер: Position сущности изменилась, и rect спрайта нужно синхронизировать."""
+    pass
+
+@dataclass(slots=True)
 class Animation:
     """Компонент для анимации движения сущности."""
     start_pos: Tuple[float, float]
@@ -200,108 +386,148 @@ class Animation:
     current_scale_x: float = 1.0
 
 # --- Спрайт карты (Card Sprite) ---
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _render_text(font: pygame.font.Font, text: str, color: Tuple[int, ...]) -> pygame.Surface:
+    """Рендерит сглаженный текст. Общий кэш для карт, UI и RenderSystem: каждая
+    уникальная надпись растеризуется один раз, пока не вытеснена из LRU."""
+    return font.render(text, True, color)
+
+def _rounded_gradient(top_color, bottom_color, radius) -> pygame.Surface:
+    """Рисует вертикальный градиент размером с карту в форме скругленного прямоугольника."""
+    gradient_surf = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
+    for y in range(CARD_HEIGHT):
+        r = top_color[0] + (bottom_color[0] - top_color[0]) * y / CARD_HEIGHT
+        g = top_color[1] + (bottom_color[1] - top_color[1]) * y / CARD_HEIGHT
+        b = top_color[2] + (bottom_color[2] - top_color[2]) * y / CARD_HEIGHT
+        pygame.draw.line(gradient_surf, (r, g, b), (0, y), (CARD_WIDTH, y))
+
+    mask = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
+    pygame.draw.rect(mask, (255, 255, 255), mask.get_rect(), border_radius=radius)
+
+    gradient_surf.blit(mask, (0, 0), None, pygame.BLEND_RGBA_MIN)
+    return gradient_surf
+
+@functools.lru_cache(maxsize=None)
+def _card_back_template() -> pygame.Surface:
+    """Рубашка карты. Одна на всех: она не зависит от данных карты."""
+    surf = _rounded_gradient((20, 20, 80), (50, 50, 120), 8)
+
+    # Рамка и центральный символ
+    pygame.draw.rect(surf, (0, 0, 0), surf.get_rect(), 2, border_radius=8)
+    pygame.draw.circle(surf, (218, 165, 32), surf.get_rect().center, 30, 3)
+    pygame.draw.circle(surf, (255, 255, 255), surf.get_rect().center, 15)
+    return surf
+
+def _draw_cost_icon(surf: pygame.Surface, font: pygame.font.Font, cost_key: Tuple[Tuple[str, int], ...]):
+    """Рисует иконку стоимости в стиле MTG в правом верхнем углу."""
+    cost_dict = dict(cost_key)
+    if not cost_dict:
+        return
+
+    mana_symbols_to_draw = []
+    # MTG convention: generic, then W, U, B, R, G
+    if 'generic' in cost_dict and cost_dict['generic'] > 0:
+        mana_symbols_to_draw.append(str(cost_dict['generic']))
+    for color in "WUBRG":
+        if color in cost_dict:
+            mana_symbols_to_draw.extend([color] * cost_dict[color])
+
+    icon_radius = 9
+    icon_diameter = icon_radius * 2
+    spacing = 2
+    x_pos = CARD_WIDTH - icon_radius - 5
+
+    for symbol in reversed(mana_symbols_to_draw):
+        pos = (x_pos, 15)
+        
+        is_generic = symbol.isdigit()
+        circle_color = (190, 190, 190) if is_generic else MANA_COLORS.get(symbol, (128, 128, 128))
+        
+        pygame.draw.circle(surf, circle_color, pos, icon_radius)
+        pygame.draw.circle(surf, (20, 20, 20), pos, icon_radius, 1) # Black border
+
+        cost_text = _render_text(font, symbol, MANA_SYMBOL_TEXT_COLOR)
+        cost_rect = cost_text.get_rect(center=pos)
+        surf.blit(cost_text, cost_rect)
+
+        x_pos -= icon_diameter + spacing
+
+@functools.lru_cache(maxsize=512)
+def _card_face_template(font: pygame.font.Font, name: str, cost_key: Tuple[Tuple[str, int], ...],
+                        card_type: Optional[str]) -> pygame.Surface:
+    """Статичная часть лицевой стороны: фон, рамка, имя, стоимость, арт и тип карты.
+
+    Эти поля не меняются за время жизни карты, поэтому шаблон строится один раз
+    на (шрифт, имя, стоимость, тип) и переиспользуется всеми спрайтами.
+    """
+    surf = _rounded_gradient(CARD_BG_COLOR_TOP, CARD_BG_COLOR_BOTTOM, 8)
+    pygame.draw.rect(surf, (0, 0, 0), surf.get_rect(), 2, border_radius=8)
+
+    # Имя карты
+    surf.blit(_render_text(font, name, FONT_COLOR), (10, 8))
+
+    # Иконка стоимости
+    _draw_cost_icon(surf, font, cost_key)
+
+    # Плейсхолдер для арта
+    art_rect = pygame.Rect(4, 30, CARD_WIDTH - 8, CARD_HEIGHT - 75)
+    pygame.draw.rect(surf, CARD_ART_BG_COLOR, art_rect)
+
+    if card_type != 'MINION':
+        type_text_str = "Заклинание" if card_type == "SPELL" else "Земля"
+        type_text = _render_text(font, type_text_str, (200, 200, 200))
+        type_rect = type_text.get_rect(centerx=CARD_WIDTH / 2, y=CARD_HEIGHT - 25)
+        surf.blit(type_text, type_rect)
+    return surf
+
+@functools.lru_cache(maxsize=None)
+def _rounded_overlay(color: Tuple[int, int, int, int]) -> pygame.Surface:
+    """Полупрозрачный оверлей размером с карту со скругленными углами."""
+    overlay_surf = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
+    pygame.draw.rect(overlay_surf, color, overlay_surf.get_rect(), border_radius=8)
+    return overlay_surf
+
 # This class is mostly the same, but now it's just a visual representation.
 class CardSprite(pygame.sprite.Sprite):
     """Визуальное представление карты в игре."""
     def __init__(self, card_id: int, card_data: Dict[str, Any], font: pygame.font.Font):
         super().__init__()
         self.card_id = card_id
-        self.card_data = card_data
         self.font = font
+        self.card_data = card_data
         self.image = pygame.Surface([CARD_WIDTH, CARD_HEIGHT], pygame.SRCALPHA)
         self.rect = self.image.get_rect()
+        self._visual_key: Optional[Tuple] = None # С какими данными и подсветкой image рисовался последний раз
         self.update_visuals() # Initial draw with no highlights
 
-    def _draw_rounded_gradient(self, top_color, bottom_color, radius):
-        """Helper to draw a rounded gradient background on self.image."""
-        gradient_surf = pygame.Surface(self.image.get_size(), pygame.SRCALPHA)
-        for y in range(CARD_HEIGHT):
-            r = top_color[0] + (bottom_color[0] - top_color[0]) * y / CARD_HEIGHT
-            g = top_color[1] + (bottom_color[1] - top_color[1]) * y / CARD_HEIGHT
-            b = top_color[2] + (bottom_color[2] - top_color[2]) * y / CARD_HEIGHT
-            pygame.draw.line(gradient_surf, (r, g, b), (0, y), (CARD_WIDTH, y))
-
-        mask = pygame.Surface(self.image.get_size(), pygame.SRCALPHA)
-        pygame.draw.rect(mask, (255, 255, 255), mask.get_rect(), border_radius=radius)
-
-        gradient_surf.blit(mask, (0, 0), None, pygame.BLEND_RGBA_MIN)
-        self.image.blit(gradient_surf, (0, 0))
-
-    def _draw_card_back(self):
-        """Рисует рубашку карты."""
-        self._draw_rounded_gradient((20, 20, 80), (50, 50, 120), 8)
-
-        # Рамка и центральный символ
-        pygame.draw.rect(self.image, (0, 0, 0), self.image.get_rect(), 2, border_radius=8)
-        pygame.draw.circle(self.image, (218, 165, 32), self.image.get_rect().center, 30, 3)
-        pygame.draw.circle(self.image, (255, 255, 255), self.image.get_rect().center, 15)
-
-    def _draw_gradient_bg(self):
-        """Рисует вертикальный градиент на фоне карты в форме скругленного прямоугольника."""
-        self._draw_rounded_gradient(CARD_BG_COLOR_TOP, CARD_BG_COLOR_BOTTOM, 8)
-
-    def _draw_cost_icon(self, cost: Any):
-        """Рисует иконку стоимости в стиле MTG в правом верхнем углу."""
-        cost_dict = cost if isinstance(cost, dict) else {}
-        if not cost_dict:
-            return
-
-        mana_symbols_to_draw = []
-        # MTG convention: generic, then W, U, B, R, G
-        if 'generic' in cost_dict and cost_dict['generic'] > 0:
-            mana_symbols_to_draw.append(str(cost_dict['generic']))
-        for color in "WUBRG":
-            if color in cost_dict:
-                mana_symbols_to_draw.extend([color] * cost_dict[color])
-
-        icon_radius = 9
-        icon_diameter = icon_radius * 2
-        spacing = 2
-        x_pos = CARD_WIDTH - icon_radius - 5
-
-        for symbol in reversed(mana_symbols_to_draw):
-            pos = (x_pos, 15)
-            
-            is_generic = symbol.isdigit()
-            circle_color = (190, 190, 190) if is_generic else MANA_COLORS.get(symbol, (128, 128, 128))
-            
-            pygame.draw.circle(self.image, circle_color, pos, icon_radius)
-            pygame.draw.circle(self.image, (20, 20, 20), pos, icon_radius, 1) # Black border
-
-            cost_text = self.font.render(symbol, True, MANA_SYMBOL_TEXT_COLOR)
-            cost_rect = cost_text.get_rect(center=pos)
-            self.image.blit(cost_text, cost_rect)
+    @property
+    def card_data(self) -> Dict[str, Any]:
+        return self._card_data
 
-            x_pos -= icon_diameter + spacing
+    @card_data.setter
+    def card_data(self, card_data: Dict[str, Any]):
+        """Меняет данные карты и заново снимает неизменяемые поля.
 
+        Имя, стоимость и тип не меняются, пока живет словарь карты; синхронизация
+        подменяет словарь целиком (например, когда скрытая карта открывается).
+        """
+        self._card_data = card_data
+        cost = card_data.get('cost')
+        cost_key = tuple(sorted(cost.items())) if isinstance(cost, dict) else ()
+        self._is_minion = card_data.get('type') == 'MINION'
+        self._base_image = _card_face_template(self.font, card_data.get('name', '???'), cost_key, card_data.get('type'))
 
     def _draw_card_face(self):
-        """Рисует лицевую сторону карты: фон, имя, стоимость и характеристики."""
-        self._draw_gradient_bg()
-        pygame.draw.rect(self.image, (0, 0, 0), self.image.get_rect(), 2, border_radius=8)
+        """Рисует лицевую сторону карты: шаблон с именем и стоимостью, затем характеристики."""
+        self.image.blit(self._base_image, (0, 0))
 
-        name = self.card_data.get('name', '???')
-        cost = self.card_data.get('cost', '?')
-        card_type = self.card_data.get('type')
-
-        # Имя карты
-        name_text = self.font.render(name, True, FONT_COLOR)
-        self.image.blit(name_text, (10, 8))
-
-        # Иконка стоимости
-        self._draw_cost_icon(cost)
-
-        # Плейсхолдер для арта
-        art_rect = pygame.Rect(4, 30, CARD_WIDTH - 8, CARD_HEIGHT - 75)
-        pygame.draw.rect(self.image, CARD_ART_BG_COLOR, art_rect)
-
-        # Тип карты и характеристики
-        if card_type == 'MINION':
+        # Характеристики существа меняются по ходу игры, поэтому не входят в шаблон
+        if self._is_minion:
             attack = self.card_data.get('attack', '?')
             health = self.card_data.get('health', '?')
             # Отображаем атаку/здоровье в виде "1/1" на светлом фоне
             stats_text_str = f"{attack}/{health}"
-            stats_text_surf = self.font.render(stats_text_str, True, STATS_TEXT_COLOR)
+            stats_text_surf = _render_text(self.font, stats_text_str, STATS_TEXT_COLOR)
 
             padding_x = 6
             padding_y = 1
@@ -317,30 +543,19 @@ class CardSprite(pygame.sprite.Sprite):
             pygame.draw.rect(self.image, STATS_BG_COLOR, stats_bg_rect, border_radius=4)
             text_rect = stats_text_surf.get_rect(center=stats_bg_rect.center)
             self.image.blit(stats_text_surf, text_rect)
-        else:
-            type_text_str = "Заклинание" if card_type == "SPELL" else "Земля"
-            type_text = self.font.render(type_text_str, True, (200, 200, 200))
-            type_rect = type_text.get_rect(centerx=CARD_WIDTH / 2, y=CARD_HEIGHT - 25)
-            self.image.blit(type_text, type_rect)
 
     def _draw_status_overlays(self):
         """Рисует оверлеи и индикаторы статусов (болезнь вызова, поворот)."""
-        # Helper to draw a single rounded overlay
-        def draw_rounded_overlay(color):
-            overlay_surf = pygame.Surface(self.image.get_size(), pygame.SRCALPHA)
-            pygame.draw.rect(overlay_surf, color, overlay_surf.get_rect(), border_radius=8)
-            self.image.blit(overlay_surf, (0, 0))
-
         # 1. Draw overlays first
         if self.card_data.get('has_sickness'):
-            draw_rounded_overlay((128, 128, 128, 100))
+            self.image.blit(_rounded_overlay((128, 128, 128, 100)), (0, 0))
 
         if self.card_data.get('is_tapped'):
-            draw_rounded_overlay((0, 0, 0, 100))
+            self.image.blit(_rounded_overlay((0, 0, 0, 100)), (0, 0))
 
         # 2. Draw text and indicators on top of overlays
         if self.card_data.get('has_sickness'):
-            zzz_text = self.font.render("Zzz", True, (200, 200, 255))
+            zzz_text = _render_text(self.font, "Zzz", (200, 200, 255))
             self.image.blit(zzz_text, (5, CARD_HEIGHT - 45))
 
         if self.card_data.get('can_attack', False):
@@ -357,10 +572,24 @@ class CardSprite(pygame.sprite.Sprite):
             pygame.draw.rect(self.image, CARD_HIGHLIGHT_COLOR, self.image.get_rect(), 4)
 
     def update_visuals(self, is_hovered: bool = False, is_selected: bool = False, force_show_back: bool = False):
-        """Перерисовывает внешний вид карты на основе ее данных."""
+        """Перерисовывает внешний вид карты на основе ее данных.
+
+        Если ни одно из отображаемых полей и ни один флаг подсветки не изменились
+        с прошлого вызова, изображение уже актуально и перерисовка пропускается.
+        """
+        card_data = self._card_data
+        show_back = force_show_back or card_data.get('is_hidden', False)
+        visual_key = (self._base_image, is_hovered, is_selected, show_back,
+                      card_data.get('attack'), card_data.get('health'), card_data.get('has_sickness'),
+                      card_data.get('is_tapped'), card_data.get('can_attack'), card_data.get('is_attacking'),
+                      card_data.get('is_pending_put_bottom'))
+        if visual_key == self._visual_key:
+            return
+        self._visual_key = visual_key
+
         self.image.fill((0, 0, 0, 0)) # Очищаем с прозрачностью
-        if force_show_back or self.card_data.get('is_hidden', False):
-            self._draw_card_back()
+        if show_back:
+            self.image.blit(_card_back_template(), (0, 0))
         else:
             self._draw_card_face()
             self._draw_status_overlays()
@@ -407,392 +636,528 @@ class ServerDiscoveryThread(threading.Thread):
                 print(f"Error in discovery thread: {e}")
         
         sock.close()
+# --- Правки состояния из событий (Patch rules) ---
+# Событие, которое только переписывает одно поле игрока или карты, описывается таблицей,
+# а не отдельной веткой кода: тип события -> [(раздел game_state_dict, поле ID в payload,
+# поле нового значения в payload, ключ в данных игрока/карты)].
+PATCH_RULES: Dict[str, List[Tuple[str, str, str, str]]] = {
+    "PLAYER_MANA_POOL_UPDATED": [("players", "player_id", "new_mana_pool", "mana_pool")],
+    "PLAYER_DAMAGED": [("players", "player_id", "new_health", "health")],
+    "CARD_ATTACKED": [("cards", "attacker_id", "attacker_new_health", "health"),
+                      ("cards", "target_id", "target_new_health", "health")],
+}
+
+def _apply_patch(rules: List[Tuple[str, str, str, str]], payload: Dict[str, Any],
+                 game_state_dict: Optional[Dict[str, Any]]):
+    """Применяет правила PATCH_RULES события к локальному состоянию.
+
+    Правка пропускается, если в payload нет ID или значения, либо объекта с таким ID нет.
+    """
+    if not game_state_dict:
+        return
+    for section, id_field, value_field, key in rules:
+        entity_id, value = payload.get(id_field), payload.get(value_field)
+        if entity_id is None or value is None:
+            continue
+        data = game_state_dict.get(section, {}).get(entity_id)
+        if data:
+            data[key] = value
+
 # --- Системы (Systems) ---
 
 class StateUpdateSystem(esper.Processor):
     """Processes messages from the server and updates the client's ECS world."""
-    def __init__(self, incoming_q: queue.Queue, discovery_q: queue.Queue, font: pygame.font.Font, client_state: ClientState, outgoing_q: queue.Queue, auto_mode: bool):
+    def __init__(self, incoming_q: queue.Queue, discovery_q: queue.Queue, font: pygame.font.Font, client_state: ClientState, outgoing_q: queue.Queue, auto_mode: bool,
+                 events_pending: Optional[threading.Event] = None):
         super().__init__()
         self.incoming_q = incoming_q
+        # Сигнал от сетевого потока о новых событиях. Если он задан, очередь опрашивается
+        # только после сигнала; без него очередь проверяется каждый кадр, как раньше.
+        self.events_pending = events_pending
         self.discovery_q = discovery_q # new
         self.font = font
         self.client_state = client_state
         self.outgoing_q = outgoing_q
         self.auto_mode = auto_mode
         self.server_timeout = 15.0 # seconds
+        self.server_prune_interval = 1.0 # seconds; чаще искать устаревшие серверы при таймауте 15 с незачем
+        self._next_prune_time = 0.0
+        # Кэш имен сущностей для лога: {entity_id: имя}. Сбрасывается при синхронизации
+        # и при изменении данных конкретной карты.
+        self._name_cache: Dict[int, str] = {}
+        self.max_name_cache_size = 512
+        # Состояние инкрементальной синхронизации мира (см. _synchronize_world):
+        # сколько сущностей уже создано и с какими данными карт последний раз рисовались спрайты.
+        self._reserved_entity_id = 0
+        self._last_card_data: Dict[int, Dict[str, Any]] = {}
+        # entity_id игрока -> ID игрока, перестраивается при каждой синхронизации мира
+        self._entity_to_player_id: Dict[int, int] = {}
+        # Обработчики событий сервера: тип события -> метод. Один поиск в словаре
+        # вместо цепочки сравнений типа со строковыми литералами.
+        self._event_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            "ASSIGN_PLAYER_ID": self._on_assign_player_id,
+            "CONNECTION_SUCCESS": self._on_connection_success,
+            "LOBBY_UPDATE": self._on_lobby_update,
+            "FULL_STATE_UPDATE": self._on_full_state_update,
+            "GAME_STARTED": self._on_game_started,
+            "GAME_OVER": self._on_game_over,
+            "CONNECTION_FAILED": self._on_connection_failed,
+            "DISCONNECTED": self._on_disconnected,
+            "PLAYER_DISCONNECTED": self._on_player_disconnected,
+            "PLAYER_RECONNECTED": self._on_player_reconnected,
+            "ACTION_ERROR": self._on_action_error,
+            "PLAYER_DAMAGED": self._on_player_damaged,
+            "CARD_ATTACKED": self._on_card_attacked,
+            "BLOCKERS_PHASE_STARTED": self._on_blockers_phase_started,
+            "COMBAT_RESOLVED": self._on_combat_resolved,
+            "TURN_ENDED": self._on_turn_ended,
+            "TURN_STARTED": self._on_turn_started,
+            "CARD_MOVED": self._on_card_moved,
+            "CARD_DIED": self._on_card_died,
+            "CHAT_MESSAGE": self._on_chat_message,
+            "CARD_DRAWN": self._on_card_drawn,
+        }
 
     def _add_log_message(self, message: str):
         """Добавляет сообщение в лог и обрезает его до максимального размера."""
         if not message: return
         log = self.client_state.log_messages
+        if log.maxlen != self.client_state.max_log_messages:
+            # Размер лога поменяли: пересоздаем deque с новым пределом, сохраняя последние строки
+            log = self.client_state.log_messages = deque(log, maxlen=self.client_state.max_log_messages)
         log.append(message)
-        if len(log) > self.client_state.max_log_messages:
-            self.client_state.log_messages = log[-self.client_state.max_log_messages:]
+        self.client_state.log_dirty = True
 
     def _get_entity_name(self, entity_id: int) -> str:
         """Возвращает имя сущности (игрока или карты) по ID."""
         if not self.client_state.game_state_dict or entity_id is None:
             return f"Сущность {entity_id}"
 
+        name = self._name_cache.get(entity_id)
+        if name is None:
+            name = self._lookup_entity_name(entity_id)
+            if len(self._name_cache) >= self.max_name_cache_size:
+                self._name_cache.clear()
+            self._name_cache[entity_id] = name
+        return name
+
+    def _add_card_to_hand(self, player_data: Dict[str, Any], card_id: int):
+        """Добавляет карту в руку игрока, поддерживая список и множество "hand_set" согласованными."""
+        hand = player_data.setdefault("hand", [])
+        hand_set = player_data.get("hand_set")
+        if hand_set is None:
+            hand_set = player_data["hand_set"] = set(hand)
+        if card_id not in hand_set:
+            hand.append(card_id)
+            hand_set.add(card_id)
+
+    def _update_opponent_id(self):
+        """Пересчитывает кэшированные ID и статус оппонента. Вызывается только при изменении
+        player_connection_status или нашего ID, а не каждый кадр."""
+        client_state = self.client_state
+        my_id = client_state.my_player_id
+        status = client_state.player_connection_status
+        opponent_id = next((pid for pid in status if pid != my_id), None)
+        client_state.opponent_id = opponent_id
+        client_state.opponent_disconnected = (opponent_id is not None and status.get(opponent_id) == "DISCONNECTED")
+
+    def _lookup_entity_name(self, entity_id: int) -> str:
+        """Ищет имя сущности в состоянии игры (без кэша)."""
         # Проверяем, игрок ли это
-        for p_id, p_data in self.client_state.game_state_dict.get("players", {}).items():
-            if p_data.get("entity_id") == entity_id:
-                my_player_id = self.client_state.my_player_id
-                if int(p_id) == my_player_id:
-                    return "Вы"
-                else:
-                    return f"Оппонент"
+        p_id = self._entity_to_player_id.get(entity_id)
+        if p_id is not None:
+            if p_id == self.client_state.my_player_id:
+                return "Вы"
+            else:
+                return f"Оппонент"
 
         # Проверяем, карта ли это
-        card_data = self.client_state.game_state_dict.get("cards", {}).get(str(entity_id))
+        card_data = self.client_state.game_state_dict.get("cards", {}).get(entity_id)
         if card_data and not card_data.get("is_hidden"):
             return card_data.get("name", f"Карта {entity_id}")
         return f"Неизвестная цель"
  
     def process(self, *args, **kwargs):
-        try:
-            # NEW: Process discovery queue
-            while True:
-                event = self.discovery_q.get_nowait()
-                event_type = event.get("type")
-
-                if event_type == "SERVER_FOUND":
-                    server_info = event["payload"]
-                    server_key = (server_info['ip'], server_info['tcp_port'])
-                    server_info['last_seen'] = time.time()
-                    self.client_state.server_list[server_key] = server_info
-                elif event_type == "DISCOVERY_ERROR":
-                    # Maybe show this error to the user
-                    print(f"Discovery Error: {event['payload']['message']}")
-
-        except queue.Empty:
-            pass
+        # NEW: Process discovery queue
+        for event in _drain_queue(self.discovery_q):
+            event_type = event.get("type")
+            self.client_state.dirty = True
+
+            if event_type == "SERVER_FOUND":
+                server_info = event["payload"]
+                server_key = (server_info['ip'], server_info['tcp_port'])
+                server_info['last_seen'] = time.time()
+                self.client_state.server_list[server_key] = server_info
+            elif event_type == "DISCOVERY_ERROR":
+                # Maybe show this error to the user
+                print(f"Discovery Error: {event['payload']['message']}")
 
         # NEW: Prune stale servers from the list
-        now = time.time()
-        stale_keys = [
-            key for key, info in self.client_state.server_list.items()
-            if now - info.get('last_seen', 0) > self.server_timeout
-        ]
-        for key in stale_keys:
-            del self.client_state.server_list[key]
+        # Список проверяется не каждый кадр, а раз в server_prune_interval, и только если он не пуст
+        if self.client_state.server_list:
+            now = time.time()
+            if now >= self._next_prune_time:
+                self._next_prune_time = now + self.server_prune_interval
+                stale_keys = [
+                    key for key, info in self.client_state.server_list.items()
+                    if now - info.get('last_seen', 0) > self.server_timeout
+                ]
+                for key in stale_keys:
+                    del self.client_state.server_list[key]
+                if stale_keys:
+                    self.client_state.dirty = True
+
+        events_pending = self.events_pending
+        if events_pending is not None:
+            if not events_pending.is_set():
+                return # На пустых кадрах не трогаем очередь
+            # Сбрасываем флаг до разбора очереди, чтобы не потерять события, пришедшие во время него
+            events_pending.clear()
+        # Забираем всю пачку событий за один захват блокировки очереди
+        for event in _drain_queue(self.incoming_q):
+            self.client_state.dirty = True
+            event_type = event.get("type")
+            patch_rules = PATCH_RULES.get(event_type)
+            if patch_rules:
+                _apply_patch(patch_rules, event.get("payload", {}), self.client_state.game_state_dict)
+            handler = self._event_handlers.get(event_type)
+            if handler is not None:
+                handler(event)
+
+    def _on_assign_player_id(self, event: Dict[str, Any]):
+        self.client_state.my_player_id = event["payload"]["player_id"]
+        self._name_cache.clear() # "Вы"/"Оппонент" зависят от нашего ID
+        self._update_opponent_id()
+
+    def _on_connection_success(self, event: Dict[str, Any]):
+        self.client_state.network_status = "CONNECTED"
+        self.client_state.game_phase = "LOBBY"
+
+    def _on_lobby_update(self, event: Dict[str, Any]):
+        # Server sent an update while we are in the lobby
+        self.client_state.game_phase = "LOBBY"
+        self.client_state.lobby_state = event.get("payload", {}).get("sessions", {})
+
+        # NEW: Auto-ready logic
+        if self.auto_mode and self.client_state.my_player_id is not None:
+            my_id_str = str(self.client_state.my_player_id)
+            my_session_data = self.client_state.lobby_state.get(my_id_str)
+            if my_session_data and not my_session_data.get("ready", False):
+                print("Auto-mode: Sending PLAYER_READY command.")
+                self.outgoing_q.put({"type": "PLAYER_READY"})
+
+    def _on_full_state_update(self, event: Dict[str, Any]):
+        # --- Сохраняем ID выбранной карты до синхронизации ---
+        old_selected_id = self.client_state.selected_entity
+
+        # Обычно NetworkThread уже привел состояние к int-ключам; тогда вызов ничего не делает
+        game_state_dict = _normalize_game_state(event.get("payload", {}))
+        self.client_state.game_state_dict = game_state_dict
+        self.client_state.active_player_id = game_state_dict.get("active_player_id")
+        self.client_state.network_status = "CONNECTED"
+
+        # The full state update is the single source of truth for the overall game phase.
+        # We remove conditional updates to prevent race conditions where an event
+        # might temporarily set the phase, only for it to be overwritten by a
+        # slightly older state update. The FSU is always right.
+        self.client_state.game_phase = game_state_dict.get("game_phase", "UNKNOWN")
+
+        # If we are forced back into mulligan (e.g. on reconnect), clear the pending cards
+        if self.client_state.game_phase == "MULLIGAN":
+            self.client_state.pending_put_bottom_cards.clear()
+
+        self.client_state.pending_attackers.clear()
+        self.client_state.game_over = False
+        self.client_state.winner_id = None
+
+        self.client_state.selected_entity = None
+        self.client_state.selected_blocker = None
+
+        for player_id in game_state_dict["players"]:
+            if player_id not in self.client_state.player_connection_status:
+                self.client_state.player_connection_status[player_id] = "CONNECTED"
+        self._update_opponent_id()
+
+        self._synchronize_world(game_state_dict)
+        self.client_state.layout_dirty.update(LAYOUT_ZONES)
+
+        # --- Восстанавливаем выбор, если сущность все еще существует ---
+        # Это предотвращает сброс выбора карты (например, заклинания с целью)
+        # при каждом обновлении состояния от сервера.
+        if old_selected_id is not None and esper.entity_exists(old_selected_id):
+            # Проверяем, что это все еще карта, которую можно выбирать (в руке, требует цели)
+            all_cards = self.client_state.game_state_dict.get("cards", {})
+            card_data = all_cards.get(old_selected_id)
+            if card_data and card_data.get("location") == "HAND":
+                effect = card_data.get("effect", {})
+                if effect.get("requires_target"):
+                    self.client_state.selected_entity = old_selected_id
+
+    def _on_game_started(self, event: Dict[str, Any]):
+        # This event is now just a signal for potential animations or sounds.
+        # The actual state change is handled by FULL_STATE_UPDATE.
+        self._add_log_message("Игра началась!")
+
+    def _on_game_over(self, event: Dict[str, Any]):
+        payload = event.get("payload", {})
+        self.client_state.game_over = True
+        self.client_state.winner_id = payload.get("winner_id")
+
+    def _on_connection_failed(self, event: Dict[str, Any]):
+        reason = event.get("payload", {}).get("reason", "Unknown error")
+        print(f"Network status: CONNECTION_FAILED. Reason: {reason}")
+        self.client_state.network_status = "FAILED"
+
+    def _on_disconnected(self, event: Dict[str, Any]):
+        print(f"Network status: DISCONNECTED")
+        self.client_state.network_status = "DISCONNECTED"
+
+    def _on_player_disconnected(self, event: Dict[str, Any]):
+        player_id = event['payload']['player_id']
+        self.client_state.player_connection_status[player_id] = "DISCONNECTED"
+        self._update_opponent_id()
+        print(f"--- Игрок {player_id} отключился. Ожидание переподключения... ---")
+
+    def _on_player_reconnected(self, event: Dict[str, Any]):
+        player_id = event['payload']['player_id']
+        self.client_state.player_connection_status[player_id] = "CONNECTED"
+        self._update_opponent_id()
+        print(f"--- Игрок {player_id} переподключился! ---")
+
+    def _on_action_error(self, event: Dict[str, Any]):
+        message = event.get("payload", {}).get("message", "Произошла ошибка")
+        self._add_log_message(f"Ошибка: {message}")
+
+    def _on_player_damaged(self, event: Dict[str, Any]):
+        self.client_state.animation_queue.append(event)
+        payload = event.get("payload", {})
+        player_id = payload.get("player_id")
+        source_id = payload.get("source_card_id") or payload.get("attacker_id")
+        source_name = self._get_entity_name(source_id)
+        target_name = self._get_entity_name(player_id)
+        self._add_log_message(f"{target_name} получает урон от {source_name}.")
+
+    def _on_card_attacked(self, event: Dict[str, Any]):
+        self.client_state.animation_queue.append(event)
+        payload = event.get("payload", {})
+        attacker_id, target_id = payload.get("attacker_id"), payload.get("target_id")
+        attacker_name = self._get_entity_name(attacker_id)
+        target_name = self._get_entity_name(target_id)
+        self._add_log_message(f"{attacker_name} сражается с {target_name}.")
+
+    def _on_blockers_phase_started(self, event: Dict[str, Any]):
+        payload = event.get("payload", {})
+        attacker_ids = payload.get("attackers", [])
+        self.client_state.phase = GamePhase.COMBAT_DECLARE_BLOCKERS
+        self.client_state.attackers = attacker_ids
+        self.client_state.pending_attackers.clear()  # Атака объявлена, очищаем список кандидатов
+
+        # Обновляем локальное состояние карт, чтобы они считались атакующими.
+        # Это необходимо для корректной отрисовки (например, красной рамки).
+        if self.client_state.game_state_dict:
+            all_cards = self.client_state.game_state_dict.get("cards", {})
+            for card_id in attacker_ids:
+                card_data = all_cards.get(card_id)
+                if card_data:
+                    card_data["is_attacking"] = True
+                    # Также помечаем их как повернутых для корректной отрисовки
+                    card_data["is_tapped"] = True
+
+        # Reset any previous blocking state
+        self.client_state.selected_blocker = None
+        self.client_state.block_assignments.clear()
+        print(f"--- Началась фаза блокирования. Атакующие: {self.client_state.attackers} ---")
+
+    def _on_combat_resolved(self, event: Dict[str, Any]):
+        # Сбрасываем флаг атаки у существ, которые участвовали в бою.
+        if self.client_state.game_state_dict:
+            all_cards = self.client_state.game_state_dict.get("cards", {})
+            for card_id in self.client_state.attackers:
+                card_data = all_cards.get(card_id)
+                if card_data:
+                    card_data["is_attacking"] = False
+        # После боя наступает вторая главная фаза
+        self.client_state.phase = GamePhase.MAIN_2
+        self.client_state.attackers.clear()
+        self.client_state.selected_blocker = None
+        self.client_state.block_assignments.clear()
+        print("--- Бой завершен ---")
+
+    def _on_turn_ended(self, event: Dict[str, Any]):
+        # При завершении хода сбрасываем состояние до начального для следующего игрока
+        # (хотя TURN_STARTED сделает то же самое, это для надежности)
+        self.client_state.phase = GamePhase.MAIN_1
+        self.client_state.attackers.clear()
+        self.client_state.pending_attackers.clear()
+        self.client_state.selected_blocker = None
+        self.client_state.block_assignments.clear()
+
+    def _on_turn_started(self, event: Dict[str, Any]):
+        # A new turn has begun for someone. Update the active player.
+        player_id = event.get("payload", {}).get("player_id")
+        self.client_state.active_player_id = player_id
+        self.client_state.phase = GamePhase.MAIN_1
+        self.client_state.pending_attackers.clear()
+        player_name = self._get_entity_name(player_id)
+        self._add_log_message(f"Начался ход игрока {self.client_state.active_player_id}.")
+
+    def _on_card_moved(self, event: Dict[str, Any]):
+        self.client_state.layout_dirty.update(LAYOUT_ZONES)
+        payload = event.get("payload", {})
+        from_zone, to_zone, card_id = payload.get("from"), payload.get("to"), payload.get("card_id")
+        if from_zone == "HAND" and to_zone == "BOARD":
+            card_name = self._get_entity_name(card_id)
+            player_name = self._get_entity_name(self.client_state.active_player_id)
+            self._add_log_message(f"{player_name} разыгрывает '{card_name}'.")
+
+    def _on_card_died(self, event: Dict[str, Any]):
+        payload = event.get("payload", {})
+        card_id, owner_id, card_data = payload.get('card_id'), payload.get('owner_id'), payload.get('card_data')
+
+        self.client_state.animation_queue.append(event)
+        self.client_state.layout_dirty.update(LAYOUT_ZONES)
+        card_name = self._get_entity_name(card_id)
+        self._add_log_message(f"'{card_name}' уничтожена.")
+
+        # Immediately update local state for graveyard
+        if self.client_state.game_state_dict and owner_id is not None and card_id is not None:
+            all_cards = self.client_state.game_state_dict.get("cards", {})
+            player_data = self.client_state.game_state_dict.get("players", {}).get(owner_id)
+            if player_data:
+                player_data["graveyard_size"] = player_data.get("graveyard_size", 0) + 1
+                player_data["graveyard_top_card_id"] = card_id
+            # Обновляем данные карты сброшенным состоянием с сервера
+            if card_data:
+                all_cards[card_id] = card_data
+                self._name_cache.pop(card_id, None)
+
+    def _on_chat_message(self, event: Dict[str, Any]):
+        payload = event.get("payload", {})
+        sender_id, text = payload.get("sender_id"), payload.get("text")
+        sender_name = f"Игрок {sender_id}"
+        if sender_id == self.client_state.my_player_id:
+            sender_name = "Вы"
+
+        self.client_state.chat_messages.append({"sender": sender_name, "text": text})
+        if len(self.client_state.chat_messages) > self.client_state.max_chat_messages:
+            self.client_state.chat_messages.pop(0)
+
+    def _on_card_drawn(self, event: Dict[str, Any]):
+        # Все три поля обязательны: без них анимацию вытягивания построить нельзя.
         try:
-            while True:
-                event = self.incoming_q.get_nowait()
-                event_type = event.get("type")
-
-                if event_type == "ASSIGN_PLAYER_ID":
-                    self.client_state.my_player_id = event["payload"]["player_id"]
-
-                elif event_type == "CONNECTION_SUCCESS":
-                    self.client_state.network_status = "CONNECTED"
-                    self.client_state.game_phase = "LOBBY"
-
-                elif event_type == "LOBBY_UPDATE":
-                    # Server sent an update while we are in the lobby
-                    self.client_state.game_phase = "LOBBY"
-                    self.client_state.lobby_state = event.get("payload", {}).get("sessions", {})
-
-                    # NEW: Auto-ready logic
-                    if self.auto_mode and self.client_state.my_player_id is not None:
-                        my_id_str = str(self.client_state.my_player_id)
-                        my_session_data = self.client_state.lobby_state.get(my_id_str)
-                        if my_session_data and not my_session_data.get("ready", False):
-                            print("Auto-mode: Sending PLAYER_READY command.")
-                            self.outgoing_q.put({"type": "PLAYER_READY"})
-
-                elif event_type == "FULL_STATE_UPDATE":
-                    # --- Сохраняем ID выбранной карты до синхронизации ---
-                    old_selected_id = self.client_state.selected_entity
-
-                    game_state_dict = event.get("payload", {})
-                    self.client_state.game_state_dict = game_state_dict
-                    self.client_state.active_player_id = game_state_dict.get("active_player_id")
-                    self.client_state.network_status = "CONNECTED"
-                    
-                    # The full state update is the single source of truth for the overall game phase.
-                    # We remove conditional updates to prevent race conditions where an event
-                    # might temporarily set the phase, only for it to be overwritten by a
-                    # slightly older state update. The FSU is always right.
-                    self.client_state.game_phase = game_state_dict.get("game_phase", "UNKNOWN")
-
-                    # If we are forced back into mulligan (e.g. on reconnect), clear the pending cards
-                    if self.client_state.game_phase == "MULLIGAN":
-                        self.client_state.pending_put_bottom_cards.clear()
-
-                    self.client_state.pending_attackers.clear()
-                    self.client_state.game_over = False
-                    self.client_state.winner_id = None
-
-                    self.client_state.selected_entity = None
-                    self.client_state.selected_blocker = None
-
-                    for player_id_str in game_state_dict.get("players", {}).keys():
-                        player_id = int(player_id_str)
-                        if player_id not in self.client_state.player_connection_status:
-                            self.client_state.player_connection_status[player_id] = "CONNECTED"
-
-                    self._synchronize_world(game_state_dict)
-
-                    # --- Восстанавливаем выбор, если сущность все еще существует ---
-                    # Это предотвращает сброс выбора карты (например, заклинания с целью)
-                    # при каждом обновлении состояния от сервера.
-                    if old_selected_id is not None and esper.entity_exists(old_selected_id):
-                        # Проверяем, что это все еще карта, которую можно выбирать (в руке, требует цели)
-                        all_cards = self.client_state.game_state_dict.get("cards", {})
-                        card_data = all_cards.get(str(old_selected_id))
-                        if card_data and card_data.get("location") == "HAND":
-                            effect = card_data.get("effect", {})
-                            if effect.get("requires_target"):
-                                self.client_state.selected_entity = old_selected_id
-
-                elif event_type == "GAME_STARTED":
-                    # This event is now just a signal for potential animations or sounds.
-                    # The actual state change is handled by FULL_STATE_UPDATE.
-                    self._add_log_message("Игра началась!")
-
-                elif event_type == "GAME_OVER":
-                    payload = event.get("payload", {})
-                    self.client_state.game_over = True
-                    self.client_state.winner_id = payload.get("winner_id")
-
-                elif event_type == "CONNECTION_FAILED":
-                    reason = event.get("payload", {}).get("reason", "Unknown error")
-                    print(f"Network status: CONNECTION_FAILED. Reason: {reason}")
-                    self.client_state.network_status = "FAILED"
-                elif event_type == "DISCONNECTED":
-                    print(f"Network status: DISCONNECTED")
-                    self.client_state.network_status = "DISCONNECTED"
-                elif event_type == "PLAYER_DISCONNECTED":
-                    player_id = event['payload']['player_id']
-                    self.client_state.player_connection_status[player_id] = "DISCONNECTED"
-                    print(f"--- Игрок {player_id} отключился. Ожидание переподключения... ---")
-                elif event_type == "PLAYER_RECONNECTED":
-                    player_id = event['payload']['player_id']
-                    self.client_state.player_connection_status[player_id] = "CONNECTED"
-                    print(f"--- Игрок {player_id} переподключился! ---")
-                elif event_type == "PLAYER_MANA_POOL_UPDATED":
-                    payload = event.get("payload", {})
-                    player_id = payload.get("player_id")
-                    new_pool = payload.get("new_mana_pool")
-                    if player_id is not None and self.client_state.game_state_dict:
-                        player_data = self.client_state.game_state_dict.get("players", {}).get(str(player_id))
-                        if player_data:
-                            player_data["mana_pool"] = new_pool
-                
-                elif event_type == "ACTION_ERROR":
-                    message = event.get("payload", {}).get("message", "Произошла ошибка")
-                    self._add_log_message(f"Ошибка: {message}")
-
-                elif event_type == "PLAYER_DAMAGED":
-                    self.client_state.animation_queue.append(event)
-                    payload = event.get("payload", {})
-                    player_id = payload.get("player_id")
-                    new_health = payload.get("new_health")
-                    if player_id is not None and new_health is not None and self.client_state.game_state_dict:
-                        player_data = self.client_state.game_state_dict.get("players", {}).get(str(player_id))
-                        if player_data:
-                            player_data["health"] = new_health
-                    
-                    source_id = payload.get("source_card_id") or payload.get("attacker_id")
-                    source_name = self._get_entity_name(source_id)
-                    target_name = self._get_entity_name(player_id)
-                    self._add_log_message(f"{target_name} получает урон от {source_name}.")
-
-                elif event_type == "CARD_ATTACKED":
-                    self.client_state.animation_queue.append(event)
-                    payload = event.get("payload", {})
-                    all_cards = self.client_state.game_state_dict.get("cards", {})
-                    attacker_id, attacker_hp = payload.get("attacker_id"), payload.get("attacker_new_health")
-                    target_id, target_hp = payload.get("target_id"), payload.get("target_new_health")
-                    if attacker_id and attacker_hp is not None and str(attacker_id) in all_cards:
-                        all_cards[str(attacker_id)]["health"] = attacker_hp
-                    if target_id and target_hp is not None and str(target_id) in all_cards:
-                        all_cards[str(target_id)]["health"] = target_hp
-                    
-                    attacker_name = self._get_entity_name(attacker_id)
-                    target_name = self._get_entity_name(target_id)
-                    self._add_log_message(f"{attacker_name} сражается с {target_name}.")
-
-                elif event_type == "BLOCKERS_PHASE_STARTED":
-                    payload = event.get("payload", {})
-                    attacker_ids = payload.get("attackers", [])
-                    self.client_state.phase = GamePhase.COMBAT_DECLARE_BLOCKERS
-                    self.client_state.attackers = attacker_ids
-                    self.client_state.pending_attackers.clear()  # Атака объявлена, очищаем список кандидатов
-
-                    # Обновляем локальное состояние карт, чтобы они считались атакующими.
-                    # Это необходимо для корректной отрисовки (например, красной рамки).
-                    if self.client_state.game_state_dict:
-                        all_cards = self.client_state.game_state_dict.get("cards", {})
-                        for card_id in attacker_ids:
-                            card_data = all_cards.get(str(card_id))
-                            if card_data:
-                                card_data["is_attacking"] = True
-                                # Также помечаем их как повернутых для корректной отрисовки
-                                card_data["is_tapped"] = True
-
-                    # Reset any previous blocking state
-                    self.client_state.selected_blocker = None
-                    self.client_state.block_assignments.clear()
-                    print(f"--- Началась фаза блокирования. Атакующие: {self.client_state.attackers} ---")
-
-                elif event_type == "COMBAT_RESOLVED":
-                    # Сбрасываем флаг атаки у существ, которые участвовали в бою.
-                    if self.client_state.game_state_dict:
-                        all_cards = self.client_state.game_state_dict.get("cards", {})
-                        for card_id in self.client_state.attackers:
-                            card_data = all_cards.get(str(card_id))
-                            if card_data:
-                                card_data["is_attacking"] = False
-                    # После боя наступает вторая главная фаза
-                    self.client_state.phase = GamePhase.MAIN_2
-                    self.client_state.attackers.clear()
-                    self.client_state.selected_blocker = None
-                    self.client_state.block_assignments.clear()
-                    print("--- Бой завершен ---")
-
-                elif event_type == "TURN_ENDED":
-                    # При завершении хода сбрасываем состояние до начального для следующего игрока
-                    # (хотя TURN_STARTED сделает то же самое, это для надежности)
-                    self.client_state.phase = GamePhase.MAIN_1
-                    self.client_state.attackers.clear()
-                    self.client_state.pending_attackers.clear()
-                    self.client_state.selected_blocker = None
-                    self.client_state.block_assignments.clear()
-
-                elif event_type == "TURN_STARTED":
-                    # A new turn has begun for someone. Update the active player.
-                    payload = event.get("payload", {})
-                    self.client_state.active_player_id = payload.get("player_id")
-                    self.client_state.phase = GamePhase.MAIN_1
-                    self.client_state.pending_attackers.clear()
-                    player_name = self._get_entity_name(payload.get("player_id"))
-                    self._add_log_message(f"Начался ход игрока {self.client_state.active_player_id}.")
-
-                elif event_type == "CARD_MOVED":
-                    payload = event.get("payload", {})
-                    if payload.get("from") == "HAND" and payload.get("to") == "BOARD":
-                        card_id = payload.get("card_id")
-                        card_name = self._get_entity_name(card_id)
-                        player_name = self._get_entity_name(self.client_state.active_player_id)
-                        self._add_log_message(f"{player_name} разыгрывает '{card_name}'.")
-
-                elif event_type == "CARD_DIED":
-                    payload = event.get("payload", {})
-                    card_id = payload.get('card_id')
-                    owner_id = payload.get('owner_id')
-                    card_data = payload.get('card_data')
-
-                    self.client_state.animation_queue.append(event)
-                    card_name = self._get_entity_name(card_id)
-                    self._add_log_message(f"'{card_name}' уничтожена.")
-
-                    # Immediately update local state for graveyard
-                    if self.client_state.game_state_dict and owner_id is not None and card_id is not None:
-                        all_cards = self.client_state.game_state_dict.get("cards", {})
-                        player_data = self.client_state.game_state_dict.get("players", {}).get(str(owner_id))
-                        if player_data:
-                            player_data["graveyard_size"] = player_data.get("graveyard_size", 0) + 1
-                            player_data["graveyard_top_card_id"] = card_id
-                        # Обновляем данные карты сброшенным состоянием с сервера
-                        if card_data:
-                            all_cards[str(card_id)] = card_data
-                elif event_type == "CHAT_MESSAGE":
-                    payload = event.get("payload", {})
-                    sender_id = payload.get("sender_id")
-                    text = payload.get("text")
-                    sender_name = f"Игрок {sender_id}"
-                    if sender_id == self.client_state.my_player_id:
-                        sender_name = "Вы"
-
-                    self.client_state.chat_messages.append({"sender": sender_name, "text": text})
-                    if len(self.client_state.chat_messages) > self.client_state.max_chat_messages:
-                        self.client_state.chat_messages.pop(0)
-
-                elif event_type == "CARD_DRAWN":
-                    payload = event.get("payload", {})
-                    player_id = payload.get("player_id")
-                    card_id = payload.get("card_id")
-                    card_data = payload.get("card_data")
-
-                    if player_id is None or card_id is None or card_data is None:
-                        continue
-
-                    # Добавляем карту в локальное состояние, чтобы другие системы ее увидели
-                    if self.client_state.game_state_dict:
-                        self.client_state.game_state_dict.setdefault("cards", {})[str(card_id)] = card_data
-                        player_data = self.client_state.game_state_dict.get("players", {}).get(str(player_id))
-                        if player_data:
-                            if "hand" not in player_data: player_data["hand"] = []
-                            if card_id not in player_data["hand"]: player_data["hand"].append(card_id)
-                    
-                    # Создаем анимацию для любого игрока
-                    if not esper.entity_exists(card_id):
-                        print(f"WARNING: Card {card_id} drawn but does not exist on client. Skipping animation.")
-                        continue
-
-                    card_sprite = CardSprite(card_id, card_data, self.font)
-                    if not esper.has_component(card_id, Drawable): esper.add_component(card_id, Drawable(card_sprite))
-                    if not esper.has_component(card_id, Clickable): esper.add_component(card_id, Clickable())
-
-                    is_my_player = (player_id == self.client_state.my_player_id)
-                    indicator_rect = get_player_indicator_rect(self.client_state, player_id)
-                    if indicator_rect:
-                        graveyard_card_right_edge = indicator_rect.centerx + CARD_WIDTH // 2
-                        deck_x = graveyard_card_right_edge + CARD_SPACING_X
-                        if is_my_player:
-                            deck_y = indicator_rect.bottom + Y_MARGIN
-                        else:
-                            deck_y = indicator_rect.top - Y_MARGIN - CARD_HEIGHT
-                    else: # Fallback
-                        if is_my_player:
-                            deck_x = SCREEN_WIDTH - CARD_WIDTH - PORTRAIT_X
-                            deck_y = PLAYER_BOARD_Y
-                        else:
-                            deck_x = SCREEN_WIDTH - CARD_WIDTH - PORTRAIT_X
-                            deck_y = OPPONENT_BOARD_Y
-                    start_pos = (deck_x, deck_y)
-
-                    if not esper.has_component(card_id, Position): esper.add_component(card_id, Position(start_pos[0], start_pos[1]))
-                    esper.add_component(card_id, Animation(start_pos=start_pos, start_time=time.time()))
-        except queue.Empty:
-            pass
+            payload = event["payload"]
+            player_id = payload["player_id"]
+            card_id = payload["card_id"]
+            card_data = payload["card_data"]
+        except KeyError:
+            return
+        if player_id is None or card_id is None or card_data is None:
+            return
+
+        self.client_state.layout_dirty.update(LAYOUT_ZONES)
+
+        # Добавляем карту в локальное состояние, чтобы другие системы ее увидели
+        if self.client_state.game_state_dict:
+            self.client_state.game_state_dict.setdefault("cards", {})[card_id] = card_data
+            self._name_cache.pop(card_id, None)
+            player_data = self.client_state.game_state_dict.get("players", {}).get(player_id)
+            if player_data:
+                self._add_card_to_hand(player_data, card_id)
+
+        # Создаем анимацию для любого игрока
+        if not esper.entity_exists(card_id):
+            print(f"WARNING: Card {card_id} drawn but does not exist on client. Skipping animation.")
+            return
+
+        card_sprite = CardSprite(card_id, card_data, self.font)
+        if not esper.has_component(card_id, Drawable): esper.add_component(card_id, Drawable(card_sprite))
+        if not esper.has_component(card_id, Clickable): esper.add_component(card_id, Clickable())
+
+        is_my_player = (player_id == self.client_state.my_player_id)
+        indicator_rect = get_player_indicator_rect(self.client_state, player_id)
+        if indicator_rect:
+            graveyard_card_right_edge = indicator_rect.centerx + CARD_WIDTH // 2
+            deck_x = graveyard_card_right_edge + CARD_SPACING_X
+            if is_my_player:
+                deck_y = indicator_rect.bottom + Y_MARGIN
+            else:
+                deck_y = indicator_rect.top - Y_MARGIN - CARD_HEIGHT
+        else: # Fallback
+            if is_my_player:
+                deck_x = SCREEN_WIDTH - CARD_WIDTH - PORTRAIT_X
+                deck_y = PLAYER_BOARD_Y
+            else:
+                deck_x = SCREEN_WIDTH - CARD_WIDTH - PORTRAIT_X
+                deck_y = OPPONENT_BOARD_Y
+        start_pos = (deck_x, deck_y)
+
+        if not esper.has_component(card_id, Position): esper.add_component(card_id, Position(start_pos[0], start_pos[1]))
+        esper.add_component(card_id, Animation(start_pos=start_pos, start_time=time.time()))
+        esper.add_component(card_id, Dirty())
+        self.client_state.positions_dirty = True
+
+    def _reserve_entities(self, max_id: int) -> bool:
+        """Гарантирует, что сущности 1..max_id существуют и их ID совпадают с серверными."""
+        if self._reserved_entity_id and not esper.entity_exists(self._reserved_entity_id):
+            # Мир очистили в обход синхронизации - начинаем заново
+            self._reserved_entity_id = 0
+        if self._reserved_entity_id == 0:
+            # Полностью очищаем мир esper. Это сбрасывает счетчик ID сущностей.
+            esper.clear_database()
+            self._last_card_data.clear()
+
+        # Ключевое исправление: создаем все сущности до максимального ID,
+        # чтобы "заполнить пробелы" в ID, возникшие после удаления карт на сервере.
+        # Уже созданные в прошлые синхронизации сущности переиспользуются.
+        for i in range(self._reserved_entity_id + 1, max_id + 1):
+            new_id = esper.create_entity()
+            if new_id != i:
+                # Эта ошибка не должна происходить после clear_database(), но проверка полезна.
+                print(f"КРИТИЧЕСКАЯ ОШИБКА СИНХРОНИЗАЦИИ: Ожидался ID {i}, но создан {new_id}.")
+                self._reserved_entity_id = 0 # В следующий раз пересоберем мир с нуля
+                return False
+            self._reserved_entity_id = i
+        return True
 
     def _synchronize_world(self, state: Dict[str, Any]):
-        """Re-creates the client world based on server state."""
-        # Полностью очищаем мир esper. Это сбрасывает счетчик ID сущностей.
-        esper.clear_database()
+        """Приводит мир клиента к состоянию сервера.
+
+        Сущности и спрайты карт переиспользуются между обновлениями: новые карты получают
+        компоненты, исчезнувшие со стола/из рук их теряют, а спрайт перерисовывается только
+        у карт, чьи данные изменились.
+        """
+        self._name_cache.clear()
 
         # Собираем все ID сущностей с сервера (игроки и карты)
         all_cards_data = state.get("cards", {})
         all_players_data = state.get("players", {})
 
         all_server_entity_ids = set()
-        for player_data in all_players_data.values():
+        entity_to_player_id = self._entity_to_player_id
+        entity_to_player_id.clear()
+        for player_id, player_data in all_players_data.items():
             if "entity_id" in player_data:
                 all_server_entity_ids.add(player_data["entity_id"])
-        for card_id_str in all_cards_data.keys():
-            all_server_entity_ids.add(int(card_id_str))
+                entity_to_player_id[player_data["entity_id"]] = player_id
+        for card_id in all_cards_data.keys():
+            all_server_entity_ids.add(card_id)
         
         if not all_server_entity_ids:
+            esper.clear_database()
+            self._reserved_entity_id = 0
+            self._last_card_data.clear()
             return # Нечего синхронизировать
 
-        # Ключевое исправление: создаем все сущности до максимального ID,
-        # чтобы "заполнить пробелы" в ID, возникшие после удаления карт на сервере.
-        max_id = max(all_server_entity_ids)
-        for i in range(1, max_id + 1):
-            new_id = esper.create_entity()
-            if new_id != i:
-                # Эта ошибка не должна происходить после clear_database(), но проверка полезна.
-                print(f"КРИТИЧЕСКАЯ ОШИБКА СИНХРОНИЗАЦИИ: Ожидался ID {i}, но создан {new_id}.")
-                return # Прерываем синхронизацию, чтобы избежать дальнейших ошибок
+        if not self._reserve_entities(max(all_server_entity_ids)):
+            return # Прерываем синхронизацию, чтобы избежать дальнейших ошибок
 
         # Теперь, когда все сущности существуют, добавляем им компоненты (только для карт).
         # ВАЖНО: Мы создаем видимые сущности только для тех карт, которые должны
         # отображаться: карты на столе (любого игрока) и карты в нашей руке.
         # Карты в колодах или в руке противника не должны иметь Drawable компонента.
-        for card_id_str, card_data in all_cards_data.items():
+        last_card_data = self._last_card_data
+        visible_cards = set()
+        for card_id, card_data in all_cards_data.items():
             card_location = card_data.get("location")
             card_owner_id = card_data.get("owner_id")
 
@@ -800,14 +1165,44 @@ class StateUpdateSystem(esper.Processor):
             is_in_my_hand = (card_location == "HAND" and card_owner_id == self.client_state.my_player_id)
             is_in_opp_hand = (card_location == "HAND" and card_owner_id != self.client_state.my_player_id)
 
-            if is_on_board or is_in_my_hand or is_in_opp_hand:
-                card_id = int(card_id_str)
-                card_sprite = CardSprite(card_id, card_data, self.font)
-                esper.add_component(card_id, Drawable(card_sprite))
+            if not (is_on_board or is_in_my_hand or is_in_opp_hand):
+                continue
+            visible_cards.add(card_id)
+
+            drawable = esper.try_component(card_id, Drawable)
+            if drawable is None:
+                esper.add_component(card_id, Drawable(CardSprite(card_id, card_data, self.font)))
+                last_card_data[card_id] = card_data.copy()
+                # rect нового спрайта стоит в (0, 0) - его надо подтянуть к Position,
+                # даже если LayoutSystem оставит карту на прежнем месте.
+                esper.add_component(card_id, Dirty())
+                self.client_state.positions_dirty = True
+            else:
+                # Спрайт всегда смотрит на актуальный словарь из game_state_dict
+                drawable.sprite.card_data = card_data
+                if last_card_data.get(card_id) != card_data:
+                    drawable.sprite.update_visuals()
+                    # Копия: RenderSystem дописывает служебные поля в живой словарь
+                    last_card_data[card_id] = card_data.copy()
+
+            if not esper.has_component(card_id, Position):
                 esper.add_component(card_id, Position(0, 0))  # Будет установлено LayoutSystem
-                # Карты противника в руке некликабельны
-                if not is_in_opp_hand:
-                    esper.add_component(card_id, Clickable())
+                esper.add_component(card_id, Dirty())
+                self.client_state.positions_dirty = True
+
+            # Карты противника в руке некликабельны
+            if is_in_opp_hand:
+                if esper.has_component(card_id, Clickable):
+                    esper.remove_component(card_id, Clickable)
+            elif not esper.has_component(card_id, Clickable):
+                esper.add_component(card_id, Clickable())
+
+        # Карты, которые больше не видны (ушли в колоду, на кладбище, из игры), теряют все компоненты
+        for ent in [ent for ent, _ in esper.get_component(Drawable) if ent not in visible_cards]:
+            for component_type in (Drawable, Position, Clickable, Dirty, Animation):
+                if esper.has_component(ent, component_type):
+                    esper.remove_component(ent, component_type)
+            last_card_data.pop(ent, None)
 
 class LayoutSystem(esper.Processor):
     """Calculates and sets the Position component for drawable entities."""
@@ -817,6 +1212,11 @@ class LayoutSystem(esper.Processor):
     def process(self, *args, **kwargs):
         client_state = self.client_state
 
+        # Позиции пересчитываются только при изменении состава зон (события, синхронизация),
+        # а не каждый кадр.
+        dirty = client_state.layout_dirty
+        if not dirty: return
+
         if not client_state.game_state_dict: return
 
         BOARD_WIDTH_LIMIT = PLAY_AREA_WIDTH
@@ -826,17 +1226,20 @@ class LayoutSystem(esper.Processor):
         if my_id is None: return
 
         all_players = client_state.game_state_dict.get("players", {})
-        my_player_data = all_players.get(str(my_id))
-        opp_id_str = next((pid for pid in all_players if int(pid) != my_id), None)
-        opp_player_data = all_players.get(opp_id_str) if opp_id_str else None
+        my_player_data = all_players.get(my_id)
+        opp_id = client_state.opponent_id
+        opp_player_data = all_players.get(opp_id) if opp_id is not None else None
 
         def arrange_cards(card_ids: List[int], y_pos: int, width_limit: int):
             # Фильтруем карты, которые могут быть удалены из мира событием (например, CARD_DIED)
-            # до того, как система расположения успеет отработать.
-            drawable_card_ids = [
-                cid for cid in card_ids if esper.entity_exists(cid) and esper.has_component(cid, Drawable)
-            ]
-            num_cards = len(drawable_card_ids)
+            # до того, как система расположения успеет отработать. Position забираем тем же
+            # запросом, чтобы не искать сущность в хранилище esper второй раз.
+            placed_cards = []
+            for cid in card_ids:
+                components = esper.try_components(cid, Drawable, Position)
+                if components is not None:
+                    placed_cards.append((cid, components[1]))
+            num_cards = len(placed_cards)
             if num_cards == 0:
                 return
 
@@ -851,26 +1254,37 @@ class LayoutSystem(esper.Processor):
 
             total_width = (num_cards - 1) * spacing + CARD_WIDTH
             start_x = PLAY_AREA_X_START + (PLAY_AREA_WIDTH - total_width) / 2
-            for i, card_id in enumerate(drawable_card_ids):
-                pos = esper.component_for_entity(card_id, Position)
+            end_y = y_pos
+            for i, (card_id, pos) in enumerate(placed_cards):
                 end_x = start_x + i * spacing
-                end_y = y_pos
 
-                if esper.has_component(card_id, Animation):
-                    animation = esper.component_for_entity(card_id, Animation)
-                    if animation.animation_type == "DRAW" and animation.end_pos is None:
+                if (animation := esper.try_component(card_id, Animation)) is not None:
+                    if animation.animation_type == "DRAW":
+                        # Раскладка пересчитывается редко, поэтому обновляем конечную точку
+                        # и для уже идущей анимации (например, если в руку пришла еще карта).
                         animation.end_pos = (end_x, end_y)
                         continue # Не меняем позицию напрямую, пусть это делает AnimationSystem
-                
+
+                if pos.x == end_x and pos.y == end_y:
+                    continue # Карта уже на месте - ее rect синхронизировать не нужно
                 pos.x, pos.y = end_x, end_y
+                if not esper.has_component(card_id, Dirty):
+                    esper.add_component(card_id, Dirty())
+                client_state.positions_dirty = True
 
         if my_player_data:
-            arrange_cards(my_player_data.get("hand", []), PLAYER_HAND_Y, HAND_WIDTH_LIMIT)
-            arrange_cards(my_player_data.get("board", []), PLAYER_BOARD_Y, BOARD_WIDTH_LIMIT)
+            if "my_hand" in dirty:
+                arrange_cards(my_player_data.get("hand", []), PLAYER_HAND_Y, HAND_WIDTH_LIMIT)
+            if "my_board" in dirty:
+                arrange_cards(my_player_data.get("board", []), PLAYER_BOARD_Y, BOARD_WIDTH_LIMIT)
         
         if opp_player_data:
-            arrange_cards(opp_player_data.get("board", []), OPPONENT_BOARD_Y, BOARD_WIDTH_LIMIT)
-            arrange_cards(opp_player_data.get("hand", []), OPPONENT_HAND_Y, HAND_WIDTH_LIMIT)
+            if "opp_board" in dirty:
+                arrange_cards(opp_player_data.get("board", []), OPPONENT_BOARD_Y, BOARD_WIDTH_LIMIT)
+            if "opp_hand" in dirty:
+                arrange_cards(opp_player_data.get("hand", []), OPPONENT_HAND_Y, HAND_WIDTH_LIMIT)
+
+        dirty.clear()
 
 class SyncSpriteRectSystem(esper.Processor):
     """
@@ -878,11 +1292,29 @@ class SyncSpriteRectSystem(esper.Processor):
     компоненту `Position`. Это критически важно для корректной работы
     обнаружения столкновений (кликов).
     """
+    def __init__(self, client_state: ClientState):
+        self.client_state = client_state
+
     def process(self, *args, **kwargs):
-        for ent, (drawable, pos) in esper.get_components(Drawable, Position):
+        # Если ни LayoutSystem, ни AnimationSystem, ни синхронизация не двигали карты,
+        # запрос к хранилищу компонентов не нужен.
+        if not self.client_state.positions_dirty:
+            return
+        self.client_state.positions_dirty = False
+
+        # Обходим только сущности с маркером Dirty: неподвижные карты не трогаем.
+        synced = []
+        for ent, (drawable, pos, _) in esper.get_components(Drawable, Position, Dirty):
             # Атрибут rect спрайта используется для обнаружения столкновений,
             # поэтому он должен быть синхронизирован с логической позицией сущности.
             drawable.sprite.rect.topleft = (pos.x, pos.y)
+            synced.append(ent)
+
+        # Маркеры снимаем после обхода, чтобы не менять хранилище во время итерации.
+        for ent in synced:
+            esper.remove_component(ent, Dirty)
+        if synced:
+            self.client_state.positions_version += 1
 
 class AnimationSystem(esper.Processor):
     """Processes and times animations for combat and other events."""
@@ -892,23 +1324,31 @@ class AnimationSystem(esper.Processor):
 
     def process(self, *args, **kwargs):
         # --- Новая логика для анимации движения ---
+        # Время берется один раз на кадр: все анимации двигаются синхронно,
+        # а завершенные удаляются после обхода, чтобы не менять хранилище во время итерации.
+        now = time.time()
+        finished = []
         for ent, (anim, pos) in esper.get_components(Animation, Position):
             if anim.animation_type == "DRAW":
                 if anim.end_pos is None:
                     # Ждем, пока LayoutSystem не определит конечную позицию
                     continue
 
-                now = time.time()
-                elapsed = now - anim.start_time
-                progress = min(1.0, elapsed / anim.duration)
-
-                # Плавная интерполяция (ease-out)
-                progress = 1 - (1 - progress) ** 3
+                t = (now - anim.start_time) / anim.duration
+                if t >= 1.0:
+                    progress = 1.0
+                else:
+                    # Плавная интерполяция (ease-out)
+                    inv = 1.0 - t
+                    progress = 1.0 - inv * inv * inv
 
                 start_x, start_y = anim.start_pos
                 end_x, end_y = anim.end_pos
                 pos.x = start_x + (end_x - start_x) * progress
                 pos.y = start_y + (end_y - start_y) * progress
+                if not esper.has_component(ent, Dirty):
+                    esper.add_component(ent, Dirty())
+                self.client_state.positions_dirty = True
 
                 # NEW: Update scale and flip status for flip effect
                 # abs(1 - 2*x) gives a value that goes 1 -> 0 -> 1 as x goes 0 -> 1
@@ -916,23 +1356,29 @@ class AnimationSystem(esper.Processor):
                 anim.is_flipped = (progress >= 0.5)
 
                 if progress >= 1.0:
-                    esper.remove_component(ent, Animation)
+                    finished.append(ent)
+                self.client_state.dirty = True
+
+        for ent in finished:
+            esper.remove_component(ent, Animation)
 
         client_state = self.client_state
         delta_time = kwargs.get("delta_time", 1/60.0)
 
         # If there's an ongoing animation, let it finish
         if client_state.current_animation is not None:
+            client_state.dirty = True # Включая последний кадр, на котором анимация снимается
             client_state.animation_timer -= delta_time
             if client_state.animation_timer <= 0:
                 # Animation finished. Check if it was a death animation that needs cleanup.
                 if client_state.current_animation.get("type") == "CARD_DIED":
                     card_id = client_state.current_animation['payload'].get('card_id')
-                    if card_id and esper.entity_exists(card_id):
-                        # The card is moved to the graveyard on the server.
-                        # On the client, we just make it invisible until the next state sync.
-                        if esper.has_component(card_id, Drawable):
-                            esper.remove_component(card_id, Drawable)
+                    # The card is moved to the graveyard on the server.
+                    # On the client, we just make it invisible until the next state sync.
+                    if esper.try_component(card_id, Drawable) is not None:
+                        esper.remove_component(card_id, Drawable)
+                        # Карта исчезла со стола, оставшиеся нужно сдвинуть
+                        client_state.layout_dirty.update(("my_board", "opp_board"))
 
                 client_state.current_animation = None
             return
@@ -953,9 +1399,59 @@ class UISetupSystem(esper.Processor):
         self.reset_to_menu = reset_to_menu_callback
         self.disconnect_and_go_back = disconnect_callback
         self.chat_input = chat_input_ref
+        # Колбэки кнопок создаются один раз, а не новой лямбдой на каждом кадре.
+        self._open_server_browser_cb = functools.partial(_open_server_browser, client_state)
+        self._request_quit_cb = functools.partial(_request_quit, client_state)
+        self._server_callback_cache: Dict[Tuple[str, int], Any] = {}
+        self._input_system: Optional["InputSystem"] = None
+        # Ключ состояния, по которому был собран текущий UI. Пока он не меняется,
+        # кнопки и их колбэки переиспользуются между кадрами.
+        self._last_ui_key: Optional[Tuple] = None
+
+    @property
+    def input_system(self) -> "InputSystem":
+        """InputSystem из процессоров esper; ищется один раз, при первом обращении."""
+        if self._input_system is None:
+            self._input_system = esper.get_processor(InputSystem)
+        return self._input_system
+
+    def _ui_key(self) -> Tuple:
+        """Собирает все поля ClientState, от которых зависит набор UI элементов."""
+        cs = self.client_state
+        if cs.game_phase == "MAIN_MENU":
+            return ("MAIN_MENU",)
+        if cs.game_phase == "SERVER_BROWSER":
+            servers = tuple(
+                (addr, info.get('server_name'), info.get('players'), info.get('status'))
+                for addr, info in sorted(cs.server_list.items())
+            )
+            return ("SERVER_BROWSER", servers)
+        if cs.network_status in ["FAILED", "DISCONNECTED"]:
+            return ("ERROR",)
+        if cs.opponent_disconnected:
+            return ("OPPONENT_DISCONNECTED",)
+        if cs.game_phase == "LOBBY":
+            my_session_data = cs.lobby_state.get(str(cs.my_player_id)) if cs.my_player_id is not None else None
+            is_ready = my_session_data.get("ready", False) if my_session_data else None
+            return ("LOBBY", cs.my_player_id, is_ready)
+        if cs.game_phase == "MULLIGAN":
+            players = cs.game_state_dict.get("players", {}) if cs.game_state_dict else {}
+            my_player_data = players.get(cs.my_player_id) or {}
+            count = my_player_data.get("mulligan_put_bottom_count", 0)
+            return ("MULLIGAN", cs.my_player_id, my_player_data.get("mulligan_state"), count,
+                    len(cs.pending_put_bottom_cards) == count)
+        is_my_turn = cs.active_player_id == cs.my_player_id
+        return (cs.game_phase, cs.phase, cs.active_player_id, cs.game_over, is_my_turn, bool(cs.game_state_dict))
 
     def process(self, *args, **kwargs):
-        # Clear UI from the previous frame
+        # Пересобираем UI, только если изменилось состояние, от которого он зависит.
+        # Пустой UI (например, при подключении) пересобирать дешево, поэтому его не кэшируем.
+        ui_key = self._ui_key()
+        if ui_key == self._last_ui_key and self.ui_manager.elements:
+            return
+        self._last_ui_key = ui_key
+
+        # Clear UI from the previous state
         self.ui_manager.clear_elements()
 
         if self.client_state.game_phase == "MAIN_MENU":
@@ -972,8 +1468,7 @@ class UISetupSystem(esper.Processor):
 
         # Если оппонент отключен, не показываем никаких интерактивных элементов.
         # Оверлей будет нарисован RenderSystem.
-        opponent_id = next((pid for pid in self.client_state.player_connection_status if pid != self.client_state.my_player_id), None)
-        if opponent_id is not None and self.client_state.player_connection_status.get(opponent_id) == "DISCONNECTED":
+        if self.client_state.opponent_disconnected:
             # Не создаем никаких кнопок.
             return
 
@@ -1001,14 +1496,14 @@ class UISetupSystem(esper.Processor):
             "Присоединиться к игре",
             pygame.Rect(center_x - button_width // 2, button_y_start, button_width, button_height),
             self.font,
-            lambda: setattr(self.client_state, 'game_phase', 'SERVER_BROWSER'),
+            self._open_server_browser_cb,
             bg_color=MENU_BUTTON_BG, hover_color=MENU_BUTTON_HOVER, pressed_color=MENU_BUTTON_PRESSED, text_color=MENU_BUTTON_TEXT
         )
         quit_button = Button(
             "Выход",
             pygame.Rect(center_x - button_width // 2, button_y_start + button_height + button_spacing, button_width, button_height),
             self.font,
-            lambda: setattr(self.client_state, 'my_player_id', -999),
+            self._request_quit_cb,
             bg_color=MENU_BUTTON_BG, hover_color=MENU_BUTTON_HOVER, pressed_color=MENU_BUTTON_PRESSED, text_color=MENU_BUTTON_TEXT
         )
         self.ui_manager.add_element(join_button)
@@ -1027,6 +1522,9 @@ class UISetupSystem(esper.Processor):
         self.ui_manager.add_element(back_button)
 
         # Кнопки для каждого найденного сервера
+        callback_cache = self._server_callback_cache
+        if len(callback_cache) > 64:
+            callback_cache.clear()
         y_pos = SCREEN_HEIGHT * 0.3 # Начинаем ниже, чтобы освободить место для заголовка
         for (ip, port), server_info in sorted(self.client_state.server_list.items()):
             server_name = server_info.get('server_name', 'Unknown Server')
@@ -1034,11 +1532,14 @@ class UISetupSystem(esper.Processor):
             status = server_info.get('status', 'UNKNOWN')
             
             button_text = f"{server_name} - {players} - {status} ({ip}:{port})"
-            
-            def make_callback(h, p):
-                return lambda: self.start_connection(h, p)
+            text_image = _render_text(self.font, button_text, BUTTON_TEXT_COLOR)
+
+            callback = callback_cache.get((ip, port))
+            if callback is None:
+                callback = callback_cache[(ip, port)] = functools.partial(self.start_connection, ip, port)
 
-            server_button = Button(button_text, pygame.Rect(SCREEN_WIDTH // 2 - 300, y_pos, 600, 40), self.font, make_callback(ip, port))
+            server_button = Button(button_text, pygame.Rect(SCREEN_WIDTH // 2 - 300, y_pos, 600, 40), self.font, callback,
+                                   text_image=text_image)
             self.ui_manager.add_element(server_button)
             y_pos += 50
 
@@ -1054,7 +1555,7 @@ class UISetupSystem(esper.Processor):
 
         # Если игрок еще не готов, показываем кнопку "Готов"
         if not my_session_data.get("ready", False):
-            input_system = esper.get_processor(InputSystem)
+            input_system = self.input_system
             def ready_callback():
                 input_system.outgoing_q.put({"type": "PLAYER_READY"})
 
@@ -1086,12 +1587,12 @@ class UISetupSystem(esper.Processor):
         if not client_state.game_state_dict or client_state.my_player_id is None:
             return
 
-        my_player_data = client_state.game_state_dict.get("players", {}).get(str(client_state.my_player_id))
+        my_player_data = client_state.game_state_dict.get("players", {}).get(client_state.my_player_id)
         if not my_player_data:
             return
 
         my_mulligan_state = my_player_data.get("mulligan_state", "NONE")
-        input_system = esper.get_processor(InputSystem)
+        input_system = self.input_system
 
         center_x = PLAY_AREA_X_START + PLAY_AREA_WIDTH // 2
         center_y = (OPPONENT_BOARD_Y + CARD_HEIGHT + PLAYER_BOARD_Y) // 2
@@ -1116,7 +1617,8 @@ class UISetupSystem(esper.Processor):
         elif my_mulligan_state == "PUT_BOTTOM":
             count = my_player_data.get("mulligan_put_bottom_count", 0)
             label_text = f"Select {count} card(s) to put on the bottom of your library."
-            label = Label(label_text, (center_x, center_y - 50), self.font, (255, 255, 255), center=True)
+            label = Label(label_text, (center_x, center_y - 50), self.font, (255, 255, 255), center=True,
+                          image=_render_text(self.font, label_text, (255, 255, 255)))
             self.ui_manager.add_element(label)
 
             # Кнопка подтверждения активна, только если выбрано нужное количество карт
@@ -1140,7 +1642,9 @@ class UISetupSystem(esper.Processor):
                 self.ui_manager.add_element(confirm_button)
 
         elif my_mulligan_state == "WAITING":
-            label = Label("Waiting for opponent to decide...", (center_x, center_y), self.medium_font, (200, 200, 200), center=True)
+            label_text = "Waiting for opponent to decide..."
+            label = Label(label_text, (center_x, center_y), self.medium_font, (200, 200, 200), center=True,
+                          image=_render_text(self.medium_font, label_text, (200, 200, 200)))
             self.ui_manager.add_element(label)
 
     def _setup_ui(self, client_state: ClientState):
@@ -1172,11 +1676,12 @@ class UISetupSystem(esper.Processor):
         # 2. Отображаем индикатор фазы
         if phase_text:
             turn_color = TURN_INDICATOR_PLAYER_COLOR if is_my_turn else TURN_INDICATOR_OPPONENT_COLOR
-            turn_label = Label(phase_text, (PORTRAIT_X, vertical_center_y - self.font.get_height() // 2), self.font, turn_color, center=False)
+            turn_label = Label(phase_text, (PORTRAIT_X, vertical_center_y - self.font.get_height() // 2), self.font, turn_color, center=False,
+                               image=_render_text(self.font, phase_text, turn_color))
             self.ui_manager.add_element(turn_label)
 
         # 3. Отображаем кнопки действий в зависимости от фазы
-        input_system = esper.get_processor(InputSystem)
+        input_system = self.input_system
         play_area_center_x = PLAY_AREA_X_START + PLAY_AREA_WIDTH // 2
         button_width = 250
         button_rect = pygame.Rect(play_area_center_x - button_width // 2, vertical_center_y - 25, button_width, 50)
@@ -1215,7 +1720,9 @@ class UISetupSystem(esper.Processor):
                 self.ui_manager.add_element(button)
             elif client_state.phase == GamePhase.COMBAT_AWAITING_CONFIRMATION:
                 # Пока ждем ответа сервера, показываем текст и не даем нажимать кнопки.
-                button = Label("Ожидание ответа сервера...", (SCREEN_WIDTH // 2, vertical_center_y), self.font, (200, 200, 200), center=True)
+                label_text = "Ожидание ответа сервера..."
+                button = Label(label_text, (SCREEN_WIDTH // 2, vertical_center_y), self.font, (200, 200, 200), center=True,
+                               image=_render_text(self.font, label_text, (200, 200, 200)))
                 self.ui_manager.add_element(button)
             elif client_state.phase == GamePhase.MAIN_2:
                 def end_turn_callback(): input_system.outgoing_q.put({"type": "END_TURN"})
@@ -1229,6 +1736,53 @@ class InputSystem(esper.Processor):
         self.client_state = client_state
         self.ui_manager = ui_manager
         self.chat_input = chat_input_ref
+        # Грубая пространственная сетка карт: {(x // CARD_WIDTH, y // CARD_HEIGHT): (entities, rects, positions)}.
+        # Карта кладется в ячейку своего левого верхнего угла. Списки ячейки параллельные,
+        # чтобы прямоугольники можно было проверить одним вызовом Rect.collidelistall.
+        self._card_grid: Dict[Tuple[int, int], Tuple[List[int], List[pygame.Rect], List["Position"]]] = {}
+        self._point_rect = pygame.Rect(0, 0, 1, 1) # Прямоугольник 1x1 под курсором для collidelistall
+        self._card_components: Optional[list] = None # Последний результат esper.get_components(Drawable, Position)
+        self._grid_version: Optional[int] = None # positions_version, для которой построена сетка
+        # Точка, сетка и результат последнего поиска карты под курсором
+        self._last_mouse_pos: Optional[Tuple[int, int]] = None
+        self._last_mouse_grid: Optional[dict] = None
+        self._last_hover: Optional[int] = None
+
+    def _rebuild_card_grid(self):
+        """Раскладывает карты из снимка кадра по ячейкам сетки."""
+        grid = {}
+        for ent, rect, _, pos in self.client_state.frame_cards:
+            cell = (rect.x // CARD_WIDTH, rect.y // CARD_HEIGHT)
+            bucket = grid.get(cell)
+            if bucket is None:
+                grid[cell] = ([ent], [rect], [pos])
+            else:
+                bucket[0].append(ent)
+                bucket[1].append(rect)
+                bucket[2].append(pos)
+        self._card_grid = grid
+
+    def _top_card_at(self, pos) -> Optional[int]:
+        """Возвращает верхнюю карту под точкой pos или None."""
+        # Карта не больше ячейки, поэтому точку могут накрывать только карты,
+        # чей левый верхний угол лежит в ячейке точки или в соседних слева/сверху.
+        cx, cy = pos[0] // CARD_WIDTH, pos[1] // CARD_HEIGHT
+        grid = self._card_grid
+        point_rect = self._point_rect
+        point_rect.topleft = pos
+        hits = []
+        for cell in ((cx, cy), (cx - 1, cy), (cx, cy - 1), (cx - 1, cy - 1)):
+            bucket = grid.get(cell)
+            if not bucket:
+                continue
+            ents, rects, positions = bucket
+            # Проверка попадания выполняется циклом на C; в Python остаются только попадания.
+            hits.extend([(ents[i], positions[i].y) for i in point_rect.collidelistall(rects)])
+        if not hits:
+            return None
+        # Если под курсором несколько карт (из-за наложения), выбираем верхнюю.
+        # В нашей игре верхние карты имеют больший Y (ближе к игроку).
+        return max(hits, key=itemgetter(1))[0]
 
     def declare_attackers(self):
         """Отправляет на сервер список выбранных атакующих и переводит клиента в состояние ожидания."""
@@ -1243,7 +1797,7 @@ class InputSystem(esper.Processor):
 
         self.outgoing_q.put({
             "type": "DECLARE_ATTACKERS",
-            "payload": {"attacker_ids": client_state.pending_attackers}
+            "payload": {"attacker_ids": list(client_state.pending_attackers)}
         })
         # Переводим клиента в состояние ожидания ответа от сервера.
         # Это предотвращает повторные нажатия и решает проблему рассинхронизации.
@@ -1253,18 +1807,50 @@ class InputSystem(esper.Processor):
     def process(self, *args, **kwargs):
         client_state = self.client_state
 
+        # Один запрос к ECS на кадр; дальше наведение, клики и RenderSystem работают со снимком.
+        # esper кэширует результат get_components до первого изменения компонентов и отдает
+        # тот же список - тогда снимок кадра не пересобирается.
+        card_components = esper.get_components(Drawable, Position)
+        if card_components is not self._card_components:
+            self._card_components = card_components
+            client_state.frame_cards = [
+                (ent, drawable.sprite.rect, drawable, pos)
+                for ent, (drawable, pos) in card_components
+            ]
+            self._grid_version = None
+        # Сетка попаданий пересобирается, только если сменился состав карт или сдвинулись их rect
+        if self._grid_version != client_state.positions_version:
+            self._grid_version = client_state.positions_version
+            self._rebuild_card_grid()
+
         # Определяем, нужно ли блокировать ввод из-за отключения оппонента.
-        opponent_id = next((pid for pid in client_state.player_connection_status if pid != client_state.my_player_id), None)
-        is_opponent_disconnected = (opponent_id is not None and client_state.player_connection_status.get(opponent_id) == "DISCONNECTED")
+        is_opponent_disconnected = client_state.opponent_disconnected
 
         # Обновляем информацию о наведении мыши каждый кадр, а не только по событию
         # Только если игра интерактивна
         if not is_opponent_disconnected:
             self._handle_mouse_motion(pygame.mouse.get_pos(), client_state)
 
-        for event in pygame.event.get():
+        # Наведение уже определено выше по текущей позиции курсора, поэтому пачка
+        # MOUSEMOTION за кадр ничего не добавляет — отбрасываем ее до основного цикла.
+        # PygameClient блокирует MOUSEMOTION в SDL, фильтр остается на случай другой настройки очереди.
+        mousemotion = pygame.MOUSEMOTION
+        events = [event for event in pygame.event.get() if event.type != mousemotion]
+        if not events:
+            return
+        # Любое оставшееся событие (клик, клавиша, событие окна) может изменить картинку
+        client_state.dirty = True
+
+        # Признаки, не зависящие от конкретного события, вычисляем один раз на кадр.
+        # Их могут изменить только колбэки UI, поэтому после них значения перечитываются.
+        net_failed = client_state.network_status in ("FAILED", "DISCONNECTED")
+        game_over = client_state.game_over
+        game_phase = client_state.game_phase
+
+        for event in events:
+            event_type = event.type
             # Событие выхода обрабатывается всегда
-            if event.type == pygame.QUIT:
+            if event_type == pygame.QUIT:
                 self.outgoing_q.put(None) # Signal network thread to close
                 client_state.my_player_id = -999 # Сигнал для выхода из главного цикла
                 return
@@ -1275,73 +1861,71 @@ class InputSystem(esper.Processor):
 
             # Let the UI Manager process the event first. If it handles it, we skip the game logic for this event.
             if self.ui_manager.process_event(event):
+                net_failed = client_state.network_status in ("FAILED", "DISCONNECTED")
+                game_over = client_state.game_over
+                game_phase = client_state.game_phase
                 continue
 
             # Если соединение не удалось или разорвано, ждем любого ввода для выхода
-            if client_state.network_status in ["FAILED", "DISCONNECTED"]:
-                if event.type in [pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN]:
+            if net_failed:
+                if event_type in (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
                     self.outgoing_q.put(None)
                     client_state.my_player_id = -999 # Сигнал для выхода
                 continue # Не обрабатываем другие события
 
             # Если игра окончена, ждем клика для возврата в лобби
-            if client_state.game_over:
-                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if game_over:
+                if event_type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     self.outgoing_q.put({"type": "RETURN_TO_LOBBY"})
                 continue # Игнорируем все остальные события
 
-            # Обработка ввода для чата в лобби
-            if client_state.game_phase == "LOBBY":
-                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    self.chat_input.is_active = self.chat_input.rect.collidepoint(event.pos)
-                
-                if self.chat_input.is_active and event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        if self.chat_input.text:
-                            self.outgoing_q.put({"type": "CHAT_MESSAGE", "payload": {"text": self.chat_input.text}})
-                            self.chat_input.text = ""
-                    elif event.key == pygame.K_BACKSPACE:
-                        self.chat_input.text = self.chat_input.text[:-1]
-                    elif len(self.chat_input.text) < self.chat_input.max_len:
-                        self.chat_input.text += event.unicode
-
-            # NEW: Mulligan phase input
-            if client_state.game_phase == "MULLIGAN":
-                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    self._handle_put_bottom_click(event.pos, client_state)
-                continue # Больше никакой ввод не обрабатывается в этой фазе
-
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1: # Left click
-                    self._handle_left_click(event.pos, client_state)
-                elif event.button == 3: # Right click
-                    self._handle_right_click(client_state) # This now also cancels selections
+            match game_phase:
+                case "LOBBY":
+                    # Обработка ввода для чата в лобби
+                    self._handle_lobby_chat_event(event)
+                case "MULLIGAN":
+                    # NEW: Mulligan phase input
+                    if event_type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                        self._handle_put_bottom_click(event.pos, client_state)
+                    continue # Больше никакой ввод не обрабатывается в этой фазе
+
+            if event_type == pygame.MOUSEBUTTONDOWN:
+                match event.button:
+                    case 1: # Left click
+                        self._handle_left_click(event.pos, client_state)
+                    case 3: # Right click
+                        self._handle_right_click(client_state) # This now also cancels selections
+
+    def _handle_lobby_chat_event(self, event: pygame.event.Event):
+        """Обрабатывает ввод в поле чата лобби."""
+        chat_input = self.chat_input
+        match event.type:
+            case pygame.MOUSEBUTTONDOWN if event.button == 1:
+                chat_input.is_active = chat_input.rect.collidepoint(event.pos)
+            case pygame.KEYDOWN if chat_input.is_active:
+                if event.key == pygame.K_RETURN:
+                    if chat_input.text:
+                        self.outgoing_q.put({"type": "CHAT_MESSAGE", "payload": {"text": chat_input.text}})
+                        chat_input.text = ""
+                elif event.key == pygame.K_BACKSPACE:
+                    chat_input.text = chat_input.text[:-1]
+                elif len(chat_input.text) < chat_input.max_len:
+                    chat_input.text += event.unicode
 
     def _handle_mouse_motion(self, pos, client_state: ClientState):
         """Обрабатывает движение мыши для определения, на какую карту наведен курсор."""
-        # Находим все карты под курсором
-        colliding_cards = []
-        # get_components не гарантирует порядок, поэтому мы должны сами найти верхнюю карту
-        for ent, (drawable, position) in esper.get_components(Drawable, Position):
-            if drawable.sprite.rect.collidepoint(pos):
-                colliding_cards.append(ent)
-
-        if not colliding_cards:
-            client_state.hovered_entity = None
+        # Курсор на месте, сетка та же и наведение никто не сбрасывал - верхняя карта не изменилась.
+        # Сетка пересобирается в новый словарь, поэтому сдвиг или удаление карт сравнение не пропустит.
+        if (pos == self._last_mouse_pos and self._card_grid is self._last_mouse_grid
+                and client_state.hovered_entity == self._last_hover):
             return
-
-        # Если под курсором несколько карт (из-за наложения), выбираем верхнюю.
-        # В нашей игре верхние карты имеют больший Y (ближе к игроку).
-        # Это простое правило, которое работает для руки и стола игрока.
-        top_card = -1
-        max_y = -1
-        for card_id in colliding_cards:
-            card_pos = esper.component_for_entity(card_id, Position)
-            if card_pos.y > max_y:
-                max_y = card_pos.y
-                top_card = card_id
-        
-        client_state.hovered_entity = top_card
+        # Находим все карты под курсором
+        # Проверяем только карты из ячеек сетки рядом с курсором, а не все карты на поле.
+        hovered = self._top_card_at(pos)
+        client_state.hovered_entity = hovered
+        self._last_mouse_pos = pos
+        self._last_mouse_grid = self._card_grid
+        self._last_hover = hovered
 
     def _handle_left_click(self, pos, client_state: ClientState):
         # Добавляем проверку: обрабатываем клики по игровым объектам (карты, портреты)
@@ -1363,11 +1947,12 @@ class InputSystem(esper.Processor):
         clicked_player_entity = None
         # Only check for portrait if no card was clicked, to avoid overlap issues
         if not clicked_card_entity:
-            opp_id_str = next((pid for pid in client_state.game_state_dict["players"] if int(pid) != client_state.my_player_id), None)
-            if opp_id_str:
-                opp_indicator_rect = get_player_indicator_rect(client_state, int(opp_id_str))
+            opp_id = client_state.opponent_id
+            opp_data = client_state.game_state_dict["players"].get(opp_id) if opp_id is not None else None
+            if opp_data is not None:
+                opp_indicator_rect = get_player_indicator_rect(client_state, opp_id)
                 if opp_indicator_rect and opp_indicator_rect.collidepoint(pos):
-                    clicked_player_entity = client_state.game_state_dict["players"][opp_id_str].get("entity_id")
+                    clicked_player_entity = opp_data.get("entity_id")
 
         # --- Handle spell targeting (if a spell is selected) ---
         # Розыгрыш заклинаний с таргетом возможен только в главные фазы
@@ -1402,7 +1987,7 @@ class InputSystem(esper.Processor):
         if client_state.phase in [GamePhase.MAIN_1, GamePhase.MAIN_2]:
             if location == "HAND":
                 if card_type == "SPELL":
-                    full_card_data = client_state.game_state_dict.get("cards", {}).get(str(clicked_entity), {})
+                    full_card_data = client_state.game_state_dict.get("cards", {}).get(clicked_entity, {})
                     spell_effect = full_card_data.get("effect", {})
                     if spell_effect.get("requires_target"):
                         client_state.selected_entity = clicked_entity  # Выбираем для таргетинга
@@ -1417,13 +2002,13 @@ class InputSystem(esper.Processor):
         elif client_state.phase == GamePhase.COMBAT_DECLARE_ATTACKERS:
             if location == "BOARD" and card_type == "MINION" and card_data.get("can_attack"):
                 if clicked_entity in client_state.pending_attackers:
-                    client_state.pending_attackers.remove(clicked_entity)
+                    client_state.pending_attackers.discard(clicked_entity)
                 else:
-                    client_state.pending_attackers.append(clicked_entity)
+                    client_state.pending_attackers.add(clicked_entity)
 
     def _handle_put_bottom_click(self, pos, client_state: ClientState):
         """Обрабатывает клики для выбора карт для низа колоды во время муллигана."""
-        my_player_data = client_state.game_state_dict.get("players", {}).get(str(client_state.my_player_id))
+        my_player_data = client_state.game_state_dict.get("players", {}).get(client_state.my_player_id)
         if not my_player_data or my_player_data.get("mulligan_state") != "PUT_BOTTOM":
             return
 
@@ -1443,12 +2028,12 @@ class InputSystem(esper.Processor):
             return
 
         if clicked_card_entity in client_state.pending_put_bottom_cards:
-            client_state.pending_put_bottom_cards.remove(clicked_card_entity)
+            del client_state.pending_put_bottom_cards[clicked_card_entity]
         else:
             # Проверяем, можно ли выбрать еще карты
             count_to_put = my_player_data.get("mulligan_put_bottom_count", 0)
             if len(client_state.pending_put_bottom_cards) < count_to_put:
-                client_state.pending_put_bottom_cards.append(clicked_card_entity)
+                client_state.pending_put_bottom_cards[clicked_card_entity] = None
  
     def _handle_blocking_click(self, pos, client_state: ClientState):
         """Handles clicks during the blocking phase."""
@@ -1457,12 +2042,9 @@ class InputSystem(esper.Processor):
         if is_my_turn:
             return # Attackers cannot perform block actions.
 
-        clicked_entity = None
-        # Find what was clicked
-        for ent, (drawable, position) in esper.get_components(Drawable, Position):
-            if drawable.sprite.rect.collidepoint(pos):
-                clicked_entity = ent
-                break
+        # Find what was clicked: тот же однопроходный поиск верхней карты, что и для наведения,
+        # без отдельного обхода всех карт и повторных запросов Position.
+        clicked_entity = self._top_card_at(pos)
         
         if not clicked_entity:
             return # Clicked on empty space
@@ -1517,108 +2099,201 @@ class RenderSystem(esper.Processor):
         self.emoji_font = emoji_font
         # Сделаем шрифт для заголовка крупнее
         self.title_font = self.big_font
+        # Что было учтено при последней отрисовке (см. process)
+        self._last_hover_key: Optional[Tuple] = None
+        self._last_search_timed_out = False
+        # Карты снимка кадра, отсортированные по X по убыванию, и для какого снимка
+        # и positions_version этот порядок посчитан
+        self._cards_by_x: List[Tuple[int, pygame.Rect, Drawable, Position]] = []
+        self._cards_by_x_source: Optional[list] = None
+        self._cards_by_x_version: Optional[int] = None
+        # Концы линий блокирования и для каких назначений, снимка и positions_version они посчитаны
+        self._block_lines: List[Tuple[Tuple[float, float], Tuple[float, float]]] = []
+        self._block_lines_key: Optional[tuple] = None
+        self._block_lines_source: Optional[list] = None
+        # Строки лога: сообщение -> (поверхность, X для центрирования)
+        self._log_cache: "OrderedDict[str, Tuple[pygame.Surface, int]]" = OrderedDict()
+        # Спрайт верхней карты кладбища для каждого игрока
+        self._graveyard_sprites: Dict[int, CardSprite] = {}
+        # Стопка колоды выглядит одинаково у обоих игроков: рисуем ее один раз
+        self._deck_pile_surf = pygame.Surface((CARD_WIDTH + 4, CARD_HEIGHT + 4), pygame.SRCALPHA)
+        deck_rect = pygame.Rect(0, 0, CARD_WIDTH, CARD_HEIGHT)
+        pygame.draw.rect(self._deck_pile_surf, (40, 40, 50), deck_rect.move(4, 4), border_radius=8)
+        pygame.draw.rect(self._deck_pile_surf, (50, 50, 60), deck_rect.move(2, 2), border_radius=8)
+        pygame.draw.rect(self._deck_pile_surf, (60, 60, 70), deck_rect, border_radius=8)
+        pygame.draw.rect(self._deck_pile_surf, (20, 20, 25), deck_rect, 2, border_radius=8)
+        # Подложки "стопки" под верхней картой кладбища: [is_my_player][число слоев]
+        self._graveyard_pile_surfs = {
+            is_mine: {layers: _make_pile_surface(layers, is_mine) for layers in range(1, GRAVEYARD_PILE_LAYERS + 1)}
+            for is_mine in (True, False)
+        }
+        # Геометрия индикаторов не зависит от состояния игры: считаем ее один раз.
+        # Ключ - is_my_player.
+        self._pentagon_geometry = {
+            True: _build_pentagon_geometry(PORTRAIT_X + CARD_WIDTH // 2, PLAYER_BOARD_Y + CARD_HEIGHT // 2),
+            False: _build_pentagon_geometry(PORTRAIT_X + CARD_WIDTH // 2, OPPONENT_BOARD_Y + CARD_HEIGHT // 2),
+        }
+        self._deck_rects = {is_mine: _deck_pile_rect(geometry.center, is_mine)
+                            for is_mine, geometry in self._pentagon_geometry.items()}
+        # Буквы цветов маны на пентагоне не меняются никогда
+        self._mana_letter_surfs = {color_char: self.font.render(color_char, True, MANA_SYMBOL_TEXT_COLOR)
+                                   for color_char in MANA_COLORS}
+        # ...как и их положение: готовые пары (поверхность, rect) для screen.blits
+        self._mana_letter_blits = {
+            is_mine: [(self._mana_letter_surfs[color_char], self._mana_letter_surfs[color_char].get_rect(center=symbol_pos))
+                      for color_char, symbol_pos, _ in geometry.mana_slots]
+            for is_mine, geometry in self._pentagon_geometry.items()
+        }
+        # Счетчики маны с обводкой, уже сведенные в одну поверхность (см. _make_outlined_digit).
+        # Значения маны малы, поэтому 0..99 готовим сразу, а редкие остальные рисуем без кэша,
+        # чтобы словарь не рос от случайных значений.
+        self._outlined_digits: Dict[int, pygame.Surface] = {n: self._make_outlined_digit(n) for n in range(100)}
+        # Полупрозрачные оверлеи неизменны, создаем их один раз, а не на каждом кадре
+        self._blocker_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self._blocker_overlay.fill((0, 0, 100, 64))
+        self._damage_flash_overlay = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
+        self._damage_flash_overlay.fill((255, 0, 0, 100)) # semi-transparent red
+        self._player_damage_overlay = pygame.Surface((MANA_PENTAGON_SIZE, MANA_PENTAGON_SIZE), pygame.SRCALPHA)
+        self._player_damage_overlay.fill((255, 0, 0, 128))
+        self._disconnect_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self._disconnect_overlay.fill((0, 0, 0, 128))  # Черный, 50% прозрачности
+        self._disconnect_text_surf = self.medium_font.render("Оппонент отключился. Ожидание...", True, (220, 220, 220))  # Светло-серый
+        self._disconnect_text_rect = self._disconnect_text_surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+        # Эмодзи боевых анимаций: растеризация через SDL_ttf дорогая, а глифы постоянны
+        self._skull_surf = self.emoji_font.render("💀", True, (200, 200, 200))
+        self._clash_surf = self.emoji_font.render("💥", True, (255, 255, 0))
+        self._log_surface = pygame.Surface((SCREEN_WIDTH, LOG_HEIGHT), pygame.SRCALPHA)
+
+    def _make_outlined_digit(self, value: int) -> pygame.Surface:
+        """Рендерит число с обводкой в 1px: четыре смещенные копии обводки и заливка поверх."""
+        text = str(value)
+        outline_surf = self.font.render(text, True, MANA_COUNT_OUTLINE_COLOR)
+        fill_surf = self.font.render(text, True, FONT_COLOR)
+        width, height = fill_surf.get_size()
+        surf = pygame.Surface((width + 2, height + 2), pygame.SRCALPHA)
+        for offset in [(0, 1), (2, 1), (1, 0), (1, 2)]:
+            surf.blit(outline_surf, offset)
+        surf.blit(fill_surf, (1, 1))
+        return surf
+
+    def _compute_block_lines(self, block_assignments: Dict[int, int]) -> List[Tuple[Tuple[float, float], Tuple[float, float]]]:
+        """Возвращает концы линий от блокирующих карт к атакующим (центры карт)."""
+        # Функцию esper берем в локальную переменную один раз, а не на каждую пару в цикле
+        try_component = esper.try_component
+        lines = []
+        for blocker_id, attacker_id in block_assignments.items():
+            blocker_pos = try_component(blocker_id, Position)
+            attacker_pos = try_component(attacker_id, Position)
+            if blocker_pos is not None and attacker_pos is not None:
+                start_pos = blocker_pos.center
+                end_pos = attacker_pos.center
+                lines.append((start_pos, end_pos))
+        return lines
+
+    def _card_blit(self, drawable: Drawable, pos: Position, is_hovered: bool, is_selected: bool,
+                   anim: Optional[Animation]) -> Optional[Tuple[pygame.Surface, Any]]:
+        """Обновляет вид карты и возвращает пару (изображение, позиция) для screen.blits.
+
+        Наведенная карта приподнимается над остальными. None - карта сжата в ноль при перевороте.
+        """
+        force_show_back, scale_x = False, 1.0
+        if anim is not None and anim.animation_type == "DRAW":
+            force_show_back = not anim.is_flipped
+            scale_x = anim.current_scale_x
+
+        drawable.sprite.update_visuals(is_hovered=is_hovered, is_selected=is_selected, force_show_back=force_show_back)
+
+        scaled_width = int(CARD_WIDTH * scale_x)
+        if scaled_width > 0:
+            lift = 20 if is_hovered else 0
+            if scaled_width == CARD_WIDTH:
+                # Карта не сжата (все карты, кроме переворачивающихся при вытягивании) —
+                # масштабирование дало бы ту же картинку, а центр совпадает с Position:
+                # рисуем изображение спрайта прямо в левый верхний угол, без Rect и пересчета центра.
+                return drawable.sprite.image, (pos.x, pos.y - lift)
+            scaled_image = pygame.transform.scale(drawable.sprite.image, (scaled_width, CARD_HEIGHT))
+            scaled_rect = scaled_image.get_rect(center=(pos.x + CARD_WIDTH / 2, pos.y + CARD_HEIGHT / 2 - lift))
+            return scaled_image, scaled_rect
+        return None
 
     def _draw_game_board(self):
         """Отрисовывает все элементы игрового поля: карты, портреты, лог и т.д."""
         client_state = self.client_state
-        hovered_card_to_draw_details = None
         hovered_entity_id = client_state.hovered_entity
 
         # --- Собираем все рисуемые карты ---
-        all_drawable_cards = []
-        for ent, (drawable, pos) in esper.get_components(Drawable, Position):
-            all_drawable_cards.append((ent, drawable, pos))
-
-        # --- Сортируем карты по X-координате (слева направо) ---
-        all_drawable_cards.sort(key=lambda item: item[2].x)
-
-        # --- Рисуем не-наведенные карты ---
-        for ent, drawable, pos in reversed(all_drawable_cards):
-            drawable.sprite.card_data['is_pending_put_bottom'] = (client_state.game_phase == "MULLIGAN" and ent in client_state.pending_put_bottom_cards)
-
-            if ent == hovered_entity_id:
-                hovered_card_to_draw_details = (ent, drawable, pos)
-                continue
-
-            is_selected = (ent == client_state.selected_entity or
-                           ent in client_state.pending_put_bottom_cards or
-                           ent == client_state.selected_blocker or
-                           (client_state.phase == GamePhase.COMBAT_DECLARE_ATTACKERS and ent in client_state.pending_attackers))
-
-            force_show_back, scale_x = False, 1.0
-            if esper.has_component(ent, Animation):
-                anim = esper.component_for_entity(ent, Animation)
-                if anim.animation_type == "DRAW":
-                    force_show_back = not anim.is_flipped
-                    scale_x = anim.current_scale_x
-            
-            drawable.sprite.update_visuals(is_hovered=False, is_selected=is_selected, force_show_back=force_show_back)
-            
-            scaled_width = int(CARD_WIDTH * scale_x)
-            if scaled_width > 0:
-                scaled_image = pygame.transform.scale(drawable.sprite.image, (scaled_width, CARD_HEIGHT))
-                scaled_rect = scaled_image.get_rect(center=(pos.x + CARD_WIDTH / 2, pos.y + CARD_HEIGHT / 2))
-                self.screen.blit(scaled_image, scaled_rect)
-
-        # --- Рисуем наведенную карту поверх всех ---
-        if hovered_card_to_draw_details:
-            ent, drawable, pos = hovered_card_to_draw_details
-            is_selected = (ent == client_state.selected_entity or
-                           ent in client_state.pending_put_bottom_cards or
-                           ent == client_state.selected_blocker or
-                           (client_state.phase == GamePhase.COMBAT_DECLARE_ATTACKERS and ent in client_state.pending_attackers))
-
-            force_show_back, scale_x = False, 1.0
-            if esper.has_component(ent, Animation):
-                anim = esper.component_for_entity(ent, Animation)
-                if anim.animation_type == "DRAW":
-                    force_show_back = not anim.is_flipped
-                    scale_x = anim.current_scale_x
-            
-            drawable.sprite.update_visuals(is_hovered=True, is_selected=is_selected, force_show_back=force_show_back)
-
-            scaled_width = int(CARD_WIDTH * scale_x)
-            if scaled_width > 0:
-                scaled_image = pygame.transform.scale(drawable.sprite.image, (scaled_width, CARD_HEIGHT))
-                scaled_rect = scaled_image.get_rect(center=(pos.x + CARD_WIDTH / 2, pos.y + CARD_HEIGHT / 2 - 20))
-                self.screen.blit(scaled_image, scaled_rect)
-
-        if client_state.selected_entity is not None and esper.has_component(client_state.selected_entity, Position):
-            selected_pos = esper.component_for_entity(client_state.selected_entity, Position)
-            start_pos = (selected_pos.x + CARD_WIDTH / 2, selected_pos.y + CARD_HEIGHT / 2)
+        # Снимок кадра уже собран InputSystem, повторно ECS не опрашиваем.
+        # --- Порядок отрисовки ---
+        # Карты рисуются справа налево: сортировка по (X, ID) по убыванию. Она пересчитывается,
+        # только если сменился снимок или карты сдвинулись; на неподвижном столе берется готовый список.
+        frame_cards = client_state.frame_cards
+        if frame_cards is not self._cards_by_x_source or client_state.positions_version != self._cards_by_x_version:
+            self._cards_by_x_source = frame_cards
+            self._cards_by_x_version = client_state.positions_version
+            self._cards_by_x = sorted(frame_cards, key=lambda card: (card[3].x, card[0]), reverse=True)
+        draw_order = self._cards_by_x
+        if hovered_entity_id is not None:
+            # Наведенная карта рисуется последней, т.е. поверх всех
+            draw_order = ([card for card in draw_order if card[0] != hovered_entity_id] +
+                          [card for card in draw_order if card[0] == hovered_entity_id])
+
+        # Анимации собираем одним проходом, чтобы не делать has_component/component_for_entity на каждую карту
+        anim_map = dict(esper.get_component(Animation))
+        is_mulligan = client_state.game_phase == "MULLIGAN"
+
+        # Выделенные карты зависят только от фазы и выбора, а не от конкретной карты:
+        # собираем их в одно множество, и на каждую карту остается одна проверка вхождения.
+        selected_set = {client_state.selected_entity, client_state.selected_blocker}
+        selected_set.update(client_state.pending_put_bottom_cards)
+        if client_state.phase == GamePhase.COMBAT_DECLARE_ATTACKERS:
+            selected_set |= client_state.pending_attackers
+
+        # Карты рисуются одним вызовом screen.blits в порядке draw_order, а не blit на каждую
+        card_blits = []
+        for ent, _, drawable, pos in draw_order:
+            drawable.sprite.card_data['is_pending_put_bottom'] = (is_mulligan and ent in client_state.pending_put_bottom_cards)
+            card_blit = self._card_blit(drawable, pos, ent == hovered_entity_id, ent in selected_set, anim_map.get(ent))
+            if card_blit is not None:
+                card_blits.append(card_blit)
+        if card_blits:
+            self.screen.blits(card_blits, doreturn=False)
+
+        if (client_state.selected_entity is not None and
+                (selected_pos := esper.try_component(client_state.selected_entity, Position)) is not None):
+            start_pos = selected_pos.center
             end_pos = pygame.mouse.get_pos()
             pygame.draw.line(self.screen, TARGET_COLOR, start_pos, end_pos, 3)
 
-        if client_state.selected_blocker is not None and esper.has_component(client_state.selected_blocker, Position):
-            selected_pos = esper.component_for_entity(client_state.selected_blocker, Position)
-            start_pos = (selected_pos.x + CARD_WIDTH / 2, selected_pos.y + CARD_HEIGHT / 2)
+        if (client_state.selected_blocker is not None and
+                (selected_pos := esper.try_component(client_state.selected_blocker, Position)) is not None):
+            start_pos = selected_pos.center
             end_pos = pygame.mouse.get_pos()
             pygame.draw.line(self.screen, (0, 0, 255), start_pos, end_pos, 3)
 
-        for blocker_id, attacker_id in client_state.block_assignments.items():
-            if esper.has_component(blocker_id, Position) and esper.has_component(attacker_id, Position):
-                blocker_pos = esper.component_for_entity(blocker_id, Position)
-                attacker_pos = esper.component_for_entity(attacker_id, Position)
-                start_pos = (blocker_pos.x + CARD_WIDTH / 2, blocker_pos.y + CARD_HEIGHT / 2)
-                end_pos = (attacker_pos.x + CARD_WIDTH / 2, attacker_pos.y + CARD_HEIGHT / 2)
+        if client_state.block_assignments:
+            # Концы линий пересчитываются, только если сменились назначения или сдвинулись карты
+            block_key = (tuple(client_state.block_assignments.items()), client_state.positions_version)
+            if block_key != self._block_lines_key or frame_cards is not self._block_lines_source:
+                self._block_lines_key = block_key
+                self._block_lines_source = frame_cards
+                self._block_lines = self._compute_block_lines(client_state.block_assignments)
+            for start_pos, end_pos in self._block_lines:
                 pygame.draw.line(self.screen, (0, 255, 255), start_pos, end_pos, 5)
 
         if client_state.phase == GamePhase.COMBAT_DECLARE_BLOCKERS:
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 100, 64))
-            self.screen.blit(overlay, (0, 0))
+            self.screen.blit(self._blocker_overlay, (0, 0))
 
         if client_state.game_state_dict:
-            my_player_data = client_state.game_state_dict.get("players", {}).get(str(client_state.my_player_id))
+            my_player_data = client_state.game_state_dict.get("players", {}).get(client_state.my_player_id)
             if my_player_data:
                 self._draw_mana_pentagon(client_state.my_player_id)
                 self._draw_deck_pile(client_state.my_player_id)
                 self._draw_graveyard_pile(client_state.my_player_id)
-            opp_id_str = next((pid for pid in client_state.game_state_dict.get("players", {}) if int(pid) != client_state.my_player_id), None)
-            if opp_id_str:
-                self._draw_mana_pentagon(int(opp_id_str))
-                self._draw_deck_pile(int(opp_id_str))
-                self._draw_graveyard_pile(int(opp_id_str))
+            opp_id = client_state.opponent_id
+            if opp_id is not None and opp_id in client_state.game_state_dict.get("players", {}):
+                self._draw_mana_pentagon(opp_id)
+                self._draw_deck_pile(opp_id)
+                self._draw_graveyard_pile(opp_id)
 
         self._draw_log(client_state)
         self._draw_connection_status_overlay(client_state)
@@ -1627,6 +2302,19 @@ class RenderSystem(esper.Processor):
 
     def process(self, *args, **kwargs):
         client_state = self.client_state
+
+        # Перерисовываем кадр, только если что-то могло измениться: состояние (dirty),
+        # идущая анимация, то, что видно под курсором (наведение, кнопки, линия прицеливания),
+        # или истечение таймаута поиска серверов.
+        hover_key = self._hover_key(pygame.mouse.get_pos())
+        search_timed_out = (client_state.game_phase == "SERVER_BROWSER" and
+                            time.time() - client_state.server_browser_enter_time > SERVER_SEARCH_TIMEOUT)
+        if (not client_state.dirty and client_state.current_animation is None and
+                hover_key == self._last_hover_key and search_timed_out == self._last_search_timed_out):
+            return
+        self._last_hover_key = hover_key
+        self._last_search_timed_out = search_timed_out
+
         self.screen.fill(BG_COLOR)
 
         if client_state.game_phase == "MAIN_MENU":
@@ -1650,6 +2338,22 @@ class RenderSystem(esper.Processor):
         # UI рисуется поверх всего, даже на экранах сообщений
         self.ui_manager.draw(self.screen)
         pygame.display.flip()
+        client_state.dirty = False
+
+    def _hover_key(self, mouse_pos: Tuple[int, int]) -> Tuple:
+        """Все, что на экране зависит от курсора: наведенная карта, кнопка под курсором
+        и, пока за курсором тянется линия прицеливания, сама позиция курсора.
+
+        Движение мыши по пустому месту ключ не меняет, и кадр не перерисовывается.
+        """
+        client_state = self.client_state
+        hovered_button = None
+        for element in self.ui_manager.elements:
+            if isinstance(element, Button) and element.rect.collidepoint(mouse_pos):
+                hovered_button = element
+                break
+        follows_cursor = client_state.selected_entity is not None or client_state.selected_blocker is not None
+        return (client_state.hovered_entity, hovered_button, mouse_pos if follows_cursor else None)
 
     def _draw_server_browser_screen(self): # NEW
         """Рисует экран списка серверов."""
@@ -1660,30 +2364,28 @@ class RenderSystem(esper.Processor):
             title_text = "Поиск серверов..."
             title_color = (200, 200, 200)
 
-        title_surf = self.medium_font.render(title_text, True, title_color)
+        title_surf = _render_text(self.medium_font, title_text, title_color)
         title_rect = title_surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT * 0.15))
         self.screen.blit(title_surf, title_rect)
 
         # Показываем сообщение "серверы не найдены" только после небольшой задержки,
         # чтобы дать время на их обнаружение.
-        # Сервер рассылает broadcast каждые 5 секунд, поэтому ждем чуть больше двух циклов.
-        SEARCH_TIMEOUT = 11.0 # seconds
         time_since_search_started = time.time() - self.client_state.server_browser_enter_time
 
-        if not self.client_state.server_list and time_since_search_started > SEARCH_TIMEOUT:
-            no_servers_text = self.font.render("Серверы не найдены. Убедитесь, что сервер запущен в вашей сети.", True, (200, 200, 200))
+        if not self.client_state.server_list and time_since_search_started > SERVER_SEARCH_TIMEOUT:
+            no_servers_text = _render_text(self.font, "Серверы не найдены. Убедитесь, что сервер запущен в вашей сети.", (200, 200, 200))
             text_rect = no_servers_text.get_rect(centerx=SCREEN_WIDTH // 2, y=SCREEN_HEIGHT // 2)
             self.screen.blit(no_servers_text, text_rect)
 
     def _draw_main_menu_screen(self):
         # Рисуем заголовок вверху экрана
-        title_surf = self.title_font.render("Cardnet", True, (255, 215, 0))
+        title_surf = _render_text(self.title_font, "Cardnet", (255, 215, 0))
         title_rect = title_surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT * 0.2))
         self.screen.blit(title_surf, title_rect)
 
     def _draw_lobby_screen(self, client_state: ClientState):
         """Рисует экран лобби в ожидании игроков."""
-        title_surf = self.title_font.render("Лобби", True, (255, 215, 0))
+        title_surf = _render_text(self.title_font, "Лобби", (255, 215, 0))
         title_rect = title_surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT * 0.1))
         self.screen.blit(title_surf, title_rect)
 
@@ -1710,7 +2412,7 @@ class RenderSystem(esper.Processor):
             if player_id == client_state.my_player_id:
                 text += " (Вы)"
 
-            text_surf = self.medium_font.render(text, True, color)
+            text_surf = _render_text(self.medium_font, text, color)
             text_rect = text_surf.get_rect(centerx=SCREEN_WIDTH // 2, y=y_start)
             self.screen.blit(text_surf, text_rect)
             y_start += self.medium_font.get_height() + 10
@@ -1727,8 +2429,8 @@ class RenderSystem(esper.Processor):
             sender_color = (255, 215, 0)  # Gold for sender
             message_color = (240, 240, 240) # Brighter white for message
 
-            sender_surf = self.font.render(sender_text, True, sender_color)
-            message_surf = self.font.render(message_text, True, message_color)
+            sender_surf = _render_text(self.font, sender_text, sender_color)
+            message_surf = _render_text(self.font, message_text, message_color)
 
             self.screen.blit(sender_surf, (chat_log_rect.x + 10, chat_y))
             self.screen.blit(message_surf, (chat_log_rect.x + 10 + sender_surf.get_width(), chat_y))
@@ -1745,12 +2447,12 @@ class RenderSystem(esper.Processor):
             text = "ПОРАЖЕНИЕ"
             color = (139, 0, 0)  # Dark Red
 
-        text_surf = self.big_font.render(text, True, color)
+        text_surf = _render_text(self.big_font, text, color)
         text_rect = text_surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
         self.screen.blit(text_surf, text_rect)
 
         # Добавляем подсказку для продолжения
-        continue_text = self.font.render("Нажмите, чтобы вернуться в лобби", True, (200, 200, 200))
+        continue_text = _render_text(self.font, "Нажмите, чтобы вернуться в лобби", (200, 200, 200))
         continue_rect = continue_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 80))
         self.screen.blit(continue_text, continue_rect)
 
@@ -1762,7 +2464,7 @@ class RenderSystem(esper.Processor):
         start_y = (SCREEN_HEIGHT - total_height) // 2
 
         for i, line in enumerate(lines):
-            text_surf = font_to_use.render(line, True, color)
+            text_surf = _render_text(font_to_use, line, color)
             text_rect = text_surf.get_rect( #
                 centerx=SCREEN_WIDTH // 2, 
                 y=start_y + i * font_to_use.get_height())
@@ -1777,91 +2479,92 @@ class RenderSystem(esper.Processor):
             attacker_id = payload.get("attacker_id")
             target_id = payload.get("target_id")
 
-            # Helper to draw damage flash on cards
-            def draw_damage_flash(card_id):
-                if esper.entity_exists(card_id) and esper.has_component(card_id, Drawable):
-                    drawable = esper.component_for_entity(card_id, Drawable)
-                    overlay = pygame.Surface(drawable.sprite.rect.size, pygame.SRCALPHA)
-                    overlay.fill((255, 0, 0, 100)) # semi-transparent red
-                    self.screen.blit(overlay, drawable.sprite.rect.topleft)
-
-            draw_damage_flash(attacker_id)
-            draw_damage_flash(target_id)
+            # Вспышки урона на обеих картах выводим одним вызовом blits
+            flash = self._damage_flash_overlay
+            flashes = [(flash, drawable.sprite.rect.topleft)
+                       for card_id in (attacker_id, target_id)
+                       if (drawable := esper.try_component(card_id, Drawable)) is not None]
+            if flashes:
+                self.screen.blits(flashes, doreturn=False)
 
             # Animate the clash only if both combatants are still on the board.
             # A combatant might have died and been removed before this animation runs.
-            if (esper.entity_exists(attacker_id) and esper.has_component(attacker_id, Position) and
-                    esper.entity_exists(target_id) and esper.has_component(target_id, Position)):
-
-                    attacker_pos = esper.component_for_entity(attacker_id, Position)
-                    target_pos = esper.component_for_entity(target_id, Position)
-
-                    start_pos = (attacker_pos.x + CARD_WIDTH / 2, attacker_pos.y + CARD_HEIGHT / 2)
-                    end_pos = (target_pos.x + CARD_WIDTH / 2, target_pos.y + CARD_HEIGHT / 2)
-                    pygame.draw.line(self.screen, (255, 100, 0), start_pos, end_pos, 7)
+            if ((attacker_pos := esper.try_component(attacker_id, Position)) is not None and
+                    (target_pos := esper.try_component(target_id, Position)) is not None):
+                start_pos = attacker_pos.center
+                end_pos = target_pos.center
+                pygame.draw.line(self.screen, (255, 100, 0), start_pos, end_pos, 7)
 
-                    clash_text = self.emoji_font.render("💥", True, (255, 255, 0))
-                    clash_rect = clash_text.get_rect(center=((start_pos[0] + end_pos[0]) / 2, (start_pos[1] + end_pos[1]) / 2))
-                    self.screen.blit(clash_text, clash_rect)
+                clash_text = self._clash_surf
+                clash_rect = clash_text.get_rect(center=((start_pos[0] + end_pos[0]) / 2, (start_pos[1] + end_pos[1]) / 2))
+                self.screen.blit(clash_text, clash_rect)
 
         elif event_type == "PLAYER_DAMAGED":
             player_id = payload.get("player_id")
             indicator_rect = get_player_indicator_rect(self.client_state, player_id)
             if indicator_rect:
-                overlay = pygame.Surface(indicator_rect.size, pygame.SRCALPHA)
-                overlay.fill((255, 0, 0, 128))
-                self.screen.blit(overlay, indicator_rect.topleft)
+                self.screen.blit(self._player_damage_overlay, indicator_rect.topleft)
 
         elif event_type == "CARD_DIED":
             card_id = payload.get("card_id")
             # The entity still exists during this animation. It will be made invisible by AnimationSystem when the timer expires.
-            if esper.entity_exists(card_id) and esper.has_component(card_id, Position):
-                card_pos = esper.component_for_entity(card_id, Position)
-                skull_text = self.emoji_font.render("💀", True, (200, 200, 200))
-                skull_rect = skull_text.get_rect(center=(card_pos.x + CARD_WIDTH / 2, card_pos.y + CARD_HEIGHT / 2))
+            if (card_pos := esper.try_component(card_id, Position)) is not None:
+                skull_text = self._skull_surf
+                skull_rect = skull_text.get_rect(center=card_pos.center)
                 self.screen.blit(skull_text, skull_rect)
 
     def _draw_connection_status_overlay(self, client_state: ClientState):
         if not client_state.my_player_id or not client_state.player_connection_status:
             return
 
-        opponent_id = next((pid for pid in client_state.player_connection_status if pid != client_state.my_player_id), None)
-
-        if opponent_id is not None and client_state.player_connection_status.get(opponent_id) == "DISCONNECTED":
+        if client_state.opponent_disconnected:
             # Рисуем полупрозрачный прямоугольник на весь экран
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 128))  # Черный, 50% прозрачности
-            self.screen.blit(overlay, (0, 0))
+            self.screen.blit(self._disconnect_overlay, (0, 0))
 
             # Рисуем текст
-            text = "Оппонент отключился. Ожидание..."
-            text_surf = self.medium_font.render(text, True, (220, 220, 220))  # Светло-серый
-            text_rect = text_surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-            self.screen.blit(text_surf, text_rect)
+            self.screen.blit(self._disconnect_text_surf, self._disconnect_text_rect)
 
     def _draw_log(self, client_state: ClientState):
         """Рисует лог событий в нижней части экрана."""
-        log_rect = pygame.Rect(0, LOG_Y, SCREEN_WIDTH, LOG_HEIGHT)
-        log_surface = pygame.Surface((SCREEN_WIDTH, LOG_HEIGHT), pygame.SRCALPHA)
+        if not client_state.log_messages:
+            return
+
+        log_surface = self._log_surface
+        if not client_state.log_dirty:
+            # Лог не менялся: выводим поверхность, собранную в прошлый раз
+            self.screen.blit(log_surface, (0, LOG_Y))
+            return
+        client_state.log_dirty = False
         log_surface.fill((20, 20, 30, 200)) # Полупрозрачный фон
 
         # Рисуем сообщения снизу вверх, чтобы новые были выше
-        for i, message in enumerate(reversed(client_state.log_messages)):
-            if i >= LOG_LINES: break # Показываем только нужное количество строк
+        log_cache = self._log_cache
+        blit_list = []
+        log_messages = client_state.log_messages
+        for i in range(min(len(log_messages), LOG_LINES)): # Показываем только нужное количество строк
+            message = log_messages[-1 - i]
+            cached = log_cache.get(message)
+            if cached is None:
+                text_surf = self.log_font.render(message, True, (200, 200, 220))
+                # Центрируем текст по горизонтали для лучшего вида
+                cached = (text_surf, (SCREEN_WIDTH - text_surf.get_width()) // 2)
+                log_cache[message] = cached
+                if len(log_cache) > LOG_LINES * 2:
+                    log_cache.popitem(last=False)
+            else:
+                log_cache.move_to_end(message)
+            text_surf, x_pos = cached
             # Небольшой отступ снизу для последней строки
             y_pos = LOG_HEIGHT - (i + 1) * LOG_LINE_HEIGHT + 2
-            text_surf = self.log_font.render(message, True, (200, 200, 220))
-            # Центрируем текст по горизонтали для лучшего вида
-            text_rect = text_surf.get_rect(centerx=SCREEN_WIDTH / 2, y=y_pos)
-            log_surface.blit(text_surf, text_rect)
-
+            blit_list.append((text_surf, (x_pos, y_pos)))
+        log_surface.blits(blit_list, doreturn=False)
 
-        self.screen.blit(log_surface, log_rect.topleft)
+        self.screen.blit(log_surface, (0, LOG_Y))
 
     def _draw_graveyard_pile(self, player_id: int):
         """Рисует стопку кладбища и верхнюю карту."""
         client_state = self.client_state
-        player_data = client_state.game_state_dict.get("players", {}).get(str(player_id))
+        player_data = client_state.game_state_dict.get("players", {}).get(player_id)
         if not player_data:
             return
 
@@ -1884,10 +2587,19 @@ class RenderSystem(esper.Processor):
         # Draw the top card if it exists
         top_card_id = player_data.get("graveyard_top_card_id")
         if top_card_id is not None:
-            card_data = client_state.game_state_dict.get("cards", {}).get(str(top_card_id))
+            card_data = client_state.game_state_dict.get("cards", {}).get(top_card_id)
             if card_data:
-                card_sprite = CardSprite(top_card_id, card_data, self.font)
-                card_sprite.update_visuals()
+                # Верхняя карта кладбища меняется редко: держим по одному спрайту на игрока
+                # и пересоздаем его, только если сменилась сама карта.
+                card_sprite = self._graveyard_sprites.get(player_id)
+                if card_sprite is None or card_sprite.card_id != top_card_id:
+                    card_sprite = CardSprite(top_card_id, card_data, self.font)
+                    self._graveyard_sprites[player_id] = card_sprite
+                else:
+                    # Данные могли смениться как новым словарем, так и на месте (PATCH_RULES);
+                    # если видимое не изменилось, update_visuals выходит по ключу без перерисовки.
+                    card_sprite.card_data = card_data
+                    card_sprite.update_visuals()
                 
                 if is_my_player:
                     card_rect = card_sprite.image.get_rect(centerx=graveyard_x, top=graveyard_y)
@@ -1895,19 +2607,18 @@ class RenderSystem(esper.Processor):
                     card_rect = card_sprite.image.get_rect(centerx=graveyard_x, bottom=graveyard_y)
                 
                 # Draw a small pile effect underneath
-                for i in range(min(graveyard_size - 1, 3), 0, -1):
-                    offset = i * 2
-                    y_offset = -offset if is_my_player else offset
-                    pile_rect = card_rect.move(-offset, y_offset)
-                    pygame.draw.rect(self.screen, (20, 20, 25), pile_rect, 0, border_radius=8)
-                    pygame.draw.rect(self.screen, (80, 80, 90), pile_rect, 1, border_radius=8)
+                layers = min(graveyard_size - 1, GRAVEYARD_PILE_LAYERS)
+                if layers > 0:
+                    pile_surf = self._graveyard_pile_surfs[is_my_player][layers]
+                    pile_y = card_rect.y - GRAVEYARD_PILE_LAYERS * 2 if is_my_player else card_rect.y
+                    self.screen.blit(pile_surf, (card_rect.x - GRAVEYARD_PILE_LAYERS * 2, pile_y))
 
                 self.screen.blit(card_sprite.image, card_rect)
 
     def _draw_deck_pile(self, player_id: int):
         """Рисует стопку колоды для игрока."""
         client_state = self.client_state
-        player_data = client_state.game_state_dict.get("players", {}).get(str(player_id))
+        player_data = client_state.game_state_dict.get("players", {}).get(player_id)
         if not player_data:
             return
 
@@ -1915,135 +2626,146 @@ class RenderSystem(esper.Processor):
         if deck_size <= 0:
             return
 
-        is_my_player = (player_id == client_state.my_player_id)
-        
-        indicator_rect = get_player_indicator_rect(client_state, player_id)
-        if not indicator_rect: return
-
-        graveyard_card_right_edge = indicator_rect.centerx + CARD_WIDTH // 2
-        deck_x = graveyard_card_right_edge + CARD_SPACING_X
-
-        if is_my_player:
-            deck_y = indicator_rect.bottom + Y_MARGIN
-        else:
-            deck_y = indicator_rect.top - Y_MARGIN - CARD_HEIGHT
-
-        deck_rect = pygame.Rect(deck_x, deck_y, CARD_WIDTH, CARD_HEIGHT)
+        if client_state.my_player_id is None:
+            return
+        deck_rect = self._deck_rects[player_id == client_state.my_player_id]
 
         # Рисуем простую стопку карт
-        pygame.draw.rect(self.screen, (40, 40, 50), deck_rect.move(4, 4), border_radius=8)
-        pygame.draw.rect(self.screen, (50, 50, 60), deck_rect.move(2, 2), border_radius=8)
-        pygame.draw.rect(self.screen, (60, 60, 70), deck_rect, border_radius=8)
-        pygame.draw.rect(self.screen, (20, 20, 25), deck_rect, 2, border_radius=8)
+        self.screen.blit(self._deck_pile_surf, deck_rect.topleft)
 
         # Рисуем количество карт
-        count_surf = self.medium_font.render(str(deck_size), True, FONT_COLOR)
+        count_surf = _render_text(self.medium_font, str(deck_size), FONT_COLOR)
         self.screen.blit(count_surf, count_surf.get_rect(center=deck_rect.center))
 
     def _draw_mana_pentagon(self, player_id: int):
         """Рисует индикатор маны и здоровья в виде пятиугольника."""
         client_state = self.client_state
-        player_data = client_state.game_state_dict.get("players", {}).get(str(player_id))
+        player_data = client_state.game_state_dict.get("players", {}).get(player_id)
         if not player_data:
             return
 
         is_my_player = (player_id == client_state.my_player_id)
 
-        size = MANA_PENTAGON_SIZE
-        radius = size // 2
-
-        if is_my_player:
-            center_x = PORTRAIT_X + CARD_WIDTH // 2
-            center_y = PLAYER_BOARD_Y + CARD_HEIGHT // 2
-        else:
-            center_x = PORTRAIT_X + CARD_WIDTH // 2
-            center_y = OPPONENT_BOARD_Y + CARD_HEIGHT // 2
-
         # Get health and mana
         health = player_data.get('health', '?')
         mana_pool_dict = player_data.get('mana_pool', {})
 
-        # --- Calculate vertices and midpoints ---
-        center_point = (center_x, center_y)
-        vertices = []
-        for i in range(5):
-            angle_rad = math.radians(-90 + 72 * i)
-            vx = center_x + radius * math.cos(angle_rad)
-            vy = center_y + radius * math.sin(angle_rad)
-            vertices.append((vx, vy))
-
-        midpoints = []
-        for i in range(5):
-            p1 = vertices[i]
-            p2 = vertices[(i + 1) % 5]
-            midpoints.append(((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2))
+        geometry = self._pentagon_geometry[is_my_player]
+        center_point = geometry.center
 
         # --- Draw sectors ---
-        mana_order = ['W', 'U', 'B', 'R', 'G']
-        for i in range(5):
-            color_char = mana_order[i]
-            midpoint_prev = midpoints[(i - 1 + 5) % 5]
-            vertex_current = vertices[i]
-            midpoint_current = midpoints[i]
-            sector_points = [center_point, midpoint_prev, vertex_current, midpoint_current]
-            sector_color = MANA_SECTOR_COLORS[color_char]
-            pygame.draw.polygon(self.screen, sector_color, sector_points)
+        for color_char, sector_points in geometry.sectors:
+            pygame.draw.polygon(self.screen, MANA_SECTOR_COLORS[color_char], sector_points)
 
         # --- Draw pentagon outline and dividers ---
-        pygame.draw.polygon(self.screen, (200, 200, 220), vertices, 2)
-        for midpoint in midpoints:
+        pygame.draw.polygon(self.screen, (200, 200, 220), geometry.vertices, 2)
+        for midpoint in geometry.midpoints:
             pygame.draw.line(self.screen, (200, 200, 220, 150), center_point, midpoint, 1)
 
         # --- Draw mana symbols and counts ---
-        symbol_radius_factor = 0.72  # Further from center
-        count_radius_factor = 0.45  # Closer to center
-        mana_angles = [-90, -18, 54, 126, 198] # Angles for W, U, B, R, G
-
-        for i, color_char in enumerate(mana_order):
+        # Кружки рисуются сразу, а надписи копятся и выводятся одним screen.blits:
+        # кружки и надписи соседних цветов не пересекаются, так что порядок наложения не меняется.
+        text_blits = list(self._mana_letter_blits[is_my_player])
+        for color_char, symbol_pos, count_pos in geometry.mana_slots:
             mana_value = mana_pool_dict.get(color_char, 0)
-            angle_rad = math.radians(mana_angles[i])
-
-            # Position for symbol (further from center, towards the edge)
-            symbol_x = center_x + radius * symbol_radius_factor * math.cos(angle_rad)
-            symbol_y = center_y + radius * symbol_radius_factor * math.sin(angle_rad)
-            pygame.draw.circle(self.screen, MANA_COLORS[color_char], (symbol_x, symbol_y), 12)
-            pygame.draw.circle(self.screen, (20, 20, 20), (symbol_x, symbol_y), 12, 1)
-            symbol_surf = self.font.render(color_char, True, MANA_SYMBOL_TEXT_COLOR)
-            self.screen.blit(symbol_surf, symbol_surf.get_rect(center=(symbol_x, symbol_y)))
-
-            # Position for count (closer to center than the symbol)
-            count_x = center_x + radius * count_radius_factor * math.cos(angle_rad)
-            count_y = center_y + radius * count_radius_factor * math.sin(angle_rad)
-            
+
+            pygame.draw.circle(self.screen, MANA_COLORS[color_char], symbol_pos, 12)
+            pygame.draw.circle(self.screen, (20, 20, 20), symbol_pos, 12, 1)
+
             # Draw count with outline
-            count_text = str(mana_value)
-            outline_color = (20, 20, 30)
-            text_color = FONT_COLOR
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                outline_surf = self.font.render(count_text, True, outline_color)
-                self.screen.blit(outline_surf, outline_surf.get_rect(center=(count_x + dx, count_y + dy)))
-            count_surf = self.font.render(count_text, True, text_color)
-            self.screen.blit(count_surf, count_surf.get_rect(center=(count_x, count_y)))
+            count_surf = self._outlined_digits.get(mana_value)
+            if count_surf is None:
+                count_surf = self._make_outlined_digit(mana_value)
+            text_blits.append((count_surf, count_surf.get_rect(center=count_pos)))
+        self.screen.blits(text_blits, doreturn=False)
 
         # --- Draw health in the center ---
-        health_circle_radius = radius * 0.3
+        health_circle_radius = geometry.health_radius
         pygame.draw.circle(self.screen, HEALTH_BG_COLOR, center_point, health_circle_radius)
         pygame.draw.circle(self.screen, (255, 255, 255), center_point, health_circle_radius, 2)
-        health_surf = self.health_font.render(str(health), True, HEALTH_COLOR)
+        health_surf = _render_text(self.health_font, str(health), HEALTH_COLOR)
         self.screen.blit(health_surf, health_surf.get_rect(center=center_point))
 
 # --- Сетевой поток (Network Thread) ---
+if orjson is not None:
+    def _decode_message(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def _encode_message(message: Dict[str, Any]) -> bytes:
+        # Ключи словарей в командах бывают int (ID сущностей), как и у json.dumps, они станут строками
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def _decode_message(data: bytes) -> Any:
+        # json.loads сам определяет UTF-8 у bytes и пропускает завершающий перевод строки
+        return json.loads(data)
+
+    def _encode_message(message: Dict[str, Any]) -> bytes:
+        return json.dumps(message).encode()
+
+def _normalize_game_state(game_state_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Готовит состояние из FULL_STATE_UPDATE к использованию клиентом.
+
+    JSON отдает ключи строками; один раз приводим их к int, чтобы во всех остальных
+    местах обращаться по ID без str()/int(). Рядом со списком руки кладется множество:
+    порядок нужен для раскладки, а проверка принадлежности должна быть O(1).
+    Повторный вызов для уже подготовленного состояния ничего не меняет.
+    """
+    for key in ("cards", "players"):
+        items = game_state_dict.get(key, {})
+        if items and isinstance(next(iter(items)), str):
+            items = {int(k): v for k, v in items.items()}
+        game_state_dict[key] = items
+    for player_data in game_state_dict["players"].values():
+        if "hand_set" not in player_data:
+            player_data["hand_set"] = set(player_data.get("hand", ()))
+    return game_state_dict
+
+class OutgoingQueue(queue.SimpleQueue):
+    """SimpleQueue исходящих команд, которая после каждого put будит цикл asyncio сетевого потока.
+
+    Системы Pygame по-прежнему просто вызывают put(), а NetworkThread ждет команды
+    на asyncio.Event вместо блокирующего get() в пуле потоков.
+    """
+    def __init__(self):
+        self._waker = None # Вызывается из потока производителя после put
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        waker = self._waker
+        if waker is not None:
+            waker()
+
+    def put_nowait(self, item):
+        # put_nowait у SimpleQueue реализован на C и не вызывает переопределенный put
+        self.put(item, block=False)
+
+    def set_waker(self, waker):
+        self._waker = waker
+
+    def remove_waker(self, waker):
+        """Снимает waker, если его не успел заменить новый сетевой поток."""
+        if self._waker is waker:
+            self._waker = None
+
 # This class remains largely the same as it's a good pattern.
 class NetworkThread(threading.Thread):
     """Поток для асинхронной работы с сетью, не блокируя Pygame."""
-    def __init__(self, incoming_q: queue.Queue, outgoing_q: queue.Queue, host: str, port: int):
+    def __init__(self, incoming_q: queue.Queue, outgoing_q: OutgoingQueue, host: str, port: int,
+                 events_pending: Optional[threading.Event] = None):
         super().__init__(daemon=True)
         self.incoming_q = incoming_q
         self.outgoing_q = outgoing_q
         self.host = host
         self.port = port
+        self.events_pending = events_pending
         self.loop = asyncio.new_event_loop()
 
+    def _post(self, event: Dict[str, Any]):
+        """Кладет событие во входящую очередь и сигнализирует главному потоку."""
+        self.incoming_q.put(event)
+        if self.events_pending is not None:
+            self.events_pending.set()
+
     async def main_async(self):
         try:
             # Добавляем таймаут для попытки подключения
@@ -2051,33 +2773,90 @@ class NetworkThread(threading.Thread):
                 asyncio.open_connection(self.host, self.port),
                 timeout=5.0
             )
-            self.incoming_q.put({"type": "CONNECTION_SUCCESS"})
+            self._post({"type": "CONNECTION_SUCCESS"})
             read_task = self.loop.create_task(self.read_from_server(reader))
             write_task = self.loop.create_task(self.write_to_server(writer))
-            await asyncio.wait([read_task, write_task], return_when=asyncio.FIRST_COMPLETED)
+            _, pending = await asyncio.wait([read_task, write_task], return_when=asyncio.FIRST_COMPLETED)
+            # Оставшуюся задачу отменяем и дожидаемся: иначе цикл остановится раньше,
+            # чем отработает ее finally (writer снимает waker с очереди исходящих команд).
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
         except (ConnectionRefusedError, TimeoutError, OSError) as e:
-            self.incoming_q.put({"type": "CONNECTION_FAILED", "payload": {"reason": str(e)}})
+            self._post({"type": "CONNECTION_FAILED", "payload": {"reason": str(e)}})
         finally:
             if self.loop.is_running():
                 self.loop.stop()
 
+    def _post_lines(self, lines: List[bytearray]):
+        """Разбирает пачку строк JSON и кладет события в очередь, сигнализируя один раз на пачку."""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                message = _decode_message(line)
+            except json.JSONDecodeError: # orjson.JSONDecodeError - его подкласс
+                print(f"Received non-JSON from server: {bytes(line)!r}")
+                continue
+            if not isinstance(message, dict):
+                # Корректный JSON, но не объект-сообщение: пропускаем, не роняя задачу чтения
+                print(f"Received non-object JSON from server: {bytes(line)!r}")
+                continue
+            if message.get("type") == "FULL_STATE_UPDATE":
+                # Нормализуем самое крупное сообщение здесь, а не в кадре главного потока
+                _normalize_game_state(message.get("payload", {}))
+            self.incoming_q.put(message)
+        if self.events_pending is not None:
+            self.events_pending.set()
+
     async def read_from_server(self, reader: asyncio.StreamReader):
+        # Читаем крупными блоками и сами режем по переводам строк: одно ожидание
+        # на TCP-пакет, а не на сообщение, и нет лимита readline на длину строки.
+        buffer = bytearray()
         while True:
-            data = await reader.readline()
-            if not data:
-                self.incoming_q.put({"type": "DISCONNECTED"})
+            chunk = await reader.read(NETWORK_READ_SIZE)
+            if not chunk:
+                if buffer:
+                    self._post_lines([buffer]) # Последнее сообщение без завершающего \n
+                self._post({"type": "DISCONNECTED"})
                 break
-            try:
-                self.incoming_q.put(json.loads(data.decode().strip()))
-            except json.JSONDecodeError:
-                print(f"Received non-JSON from server: {data.decode()}")
+            buffer += chunk
+            end = buffer.rfind(b'\n')
+            if end < 0:
+                continue # Сообщение еще не пришло целиком
+            lines = buffer[:end].split(b'\n')
+            del buffer[:end + 1]
+            self._post_lines(lines)
 
     async def write_to_server(self, writer: asyncio.StreamWriter):
-        while True:
-            command = await self.loop.run_in_executor(None, self.outgoing_q.get)
-            if command is None: break
-            writer.write((json.dumps(command) + '\n').encode())
-            await writer.drain()
+        commands_ready = asyncio.Event()
+        waker = functools.partial(self.loop.call_soon_threadsafe, commands_ready.set)
+        self.outgoing_q.set_waker(waker)
+        try:
+            while True:
+                # Сбрасываем флаг до разбора очереди: put, случившийся после get_nowait,
+                # снова взведет его, и команда не потеряется.
+                commands_ready.clear()
+                # Все накопившиеся команды кодируем в один буфер: один write и один drain на пачку
+                chunks = []
+                stop = False
+                while True:
+                    try:
+                        command = self.outgoing_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if command is None:
+                        stop = True
+                        break
+                    chunks.append(_encode_message(command))
+                if chunks:
+                    chunks.append(b'')
+                    writer.write(b'\n'.join(chunks))
+                    await writer.drain()
+                if stop: return
+                await commands_ready.wait()
+        finally:
+            self.outgoing_q.remove_waker(waker)
 
     def run(self):
         asyncio.set_event_loop(self.loop)
@@ -2100,6 +2879,7 @@ class PygameClient:
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         load_assets() # Загружаем ассеты при инициализации
         pygame.display.set_caption("Cardnet ECS Client")
+        pygame.event.set_blocked(BLOCKED_EVENT_TYPES)
         # --- Fonts ---
         self.font = pygame.font.Font(None, 24)
         self.medium_font = pygame.font.Font(None, 50)
@@ -2119,7 +2899,10 @@ class PygameClient:
         self.ui_manager = UIManager()
         self.running = True
         self.incoming_queue = queue.Queue()
-        self.outgoing_queue = queue.Queue()
+        self.incoming_events = threading.Event() # Устанавливается сетевым потоком после каждого put
+        # Единственный производитель (главный поток) и единственный потребитель (сетевой поток):
+        # SimpleQueue реализована на C и не использует Condition, как queue.Queue.
+        self.outgoing_queue = OutgoingQueue()
         self.discovery_queue = queue.Queue()
         self.host = host
         self.port = port
@@ -2160,7 +2943,7 @@ class PygameClient:
         self.client_state.network_status = "CONNECTING"
         self.client_state.game_phase = "CONNECTING"
 
-        self.network_thread = NetworkThread(self.incoming_queue, self.outgoing_queue, host, port)
+        self.network_thread = NetworkThread(self.incoming_queue, self.outgoing_queue, host, port, self.incoming_events)
         self.network_thread.start()
 
     def disconnect_and_go_to_server_browser(self):
@@ -2184,6 +2967,9 @@ class PygameClient:
         cs.game_over = False
         cs.winner_id = None
         cs.player_connection_status.clear()
+        cs.opponent_id = None
+        cs.opponent_disconnected = False
+        cs.dirty = True
         cs.phase = GamePhase.MAIN_1
         cs.attackers.clear()
         cs.pending_attackers.clear()
@@ -2215,6 +3001,9 @@ class PygameClient:
         cs.game_over = False
         cs.winner_id = None
         cs.player_connection_status.clear()
+        cs.opponent_id = None
+        cs.opponent_disconnected = False
+        cs.dirty = True
         cs.phase = GamePhase.MAIN_1
         cs.attackers.clear()
         cs.pending_attackers.clear()
@@ -2225,10 +3014,12 @@ class PygameClient:
         cs.current_animation = None
         cs.animation_timer = 0.0
         cs.log_messages.clear()
+        cs.log_dirty = True
         # Очищаем очереди на случай, если там что-то осталось
-        while not self.incoming_queue.empty(): self.incoming_queue.get_nowait()
-        while not self.outgoing_queue.empty(): self.outgoing_queue.get_nowait()
-        while not self.discovery_queue.empty(): self.discovery_queue.get_nowait()
+        _clear_queue(self.incoming_queue)
+        self.incoming_events.clear()
+        _clear_queue(self.outgoing_queue)
+        _clear_queue(self.discovery_queue)
 
     def run(self):
         # Instantiate systems that might depend on each other
@@ -2242,17 +3033,21 @@ class PygameClient:
 
         # Add systems to the world in the correct order for the game loop.
         # State -> Animation -> Layout -> Sync Rect -> UI Setup -> Input -> Render
-        esper.add_processor(StateUpdateSystem(self.incoming_queue, self.discovery_queue, self.font, self.client_state, self.outgoing_queue, self.auto_mode))
+        esper.add_processor(StateUpdateSystem(self.incoming_queue, self.discovery_queue, self.font, self.client_state, self.outgoing_queue, self.auto_mode,
+                                              self.incoming_events))
         esper.add_processor(AnimationSystem(self.client_state))
         esper.add_processor(LayoutSystem(self.client_state))
-        esper.add_processor(SyncSpriteRectSystem())
+        esper.add_processor(SyncSpriteRectSystem(self.client_state))
         esper.add_processor(ui_setup_system)
         esper.add_processor(input_system)
         esper.add_processor(render_system)
 
         while self.running:
             delta_time = self.clock.tick(60) / 1000.0
+            cursor_visible = self.chat_input.cursor_visible
             self.chat_input.update(delta_time)
+            if self.chat_input.cursor_visible != cursor_visible:
+                self.client_state.dirty = True # Мигание курсора в поле чата
 
             # Check for exit signal
             if self.client_state.my_player_id == -999: # Сигнал выхода из InputSystem
@@ -2280,6 +3075,16 @@ class PygameClient:
         pygame.quit()
         sys.exit()
 
+def _positive_float(value: str) -> float:
+    """Тип для argparse: конечное число больше нуля."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидалось число, получено {value!r}")
+    if not (number > 0 and math.isfinite(number)):
+        raise argparse.ArgumentTypeError(f"значение должно быть положительным числом, получено {value!r}")
+    return number
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Cardnet: клиент для сетевой карточной игры.")
     parser.add_argument('--host', type=str, default='127.0.0.1',
@@ -2288,7 +3093,13 @@ if __name__ == "__main__":
                         help='Порт сервера для подключения (по умолчанию: 8888)')
     parser.add_argument('--auto', action='store_true',
                         help='Автоматически подключиться и подтвердить готовность.')
+    parser.add_argument('--switch-interval', type=_positive_float, default=None,
+                        help='Интервал переключения GIL между потоками в секундах (sys.setswitchinterval). '
+                             'Меньшее значение быстрее отдает GIL сетевому потоку, большее - реже прерывает кадр.')
     args = parser.parse_args()
 
+    if args.switch_interval is not None:
+        sys.setswitchinterval(args.switch_interval)
+
     client = PygameClient(host=args.host, port=args.port, auto=args.auto)
     client.run()
\ No newline at end of file
@@ -4,7 +4,7 @@ import pygame
 import queue
 import esper
 
-from src.client.main import InputSystem, ClientState, Position, Drawable, Clickable, CardSprite, UIManager, RenderSystem, GamePhase, TextInput
+from src.client.main import InputSystem, ClientState, Position, Drawable, Clickable, CardSprite, UIManager, GamePhase, TextInput, get_player_indicator_rect
 from src.client.ui import MENU_BUTTON_TEXT
 
 class TestInputSystem(unittest.TestCase):
@@ -15,14 +15,6 @@ class TestInputSystem(unittest.TestCase):
         self.client_state = ClientState()
         self.outgoing_queue = queue.Queue()
         self.ui_manager = UIManager()
-        
-        # Мокаем RenderSystem, так как InputSystem зависит от него для получения координат портретов
-        self.mock_render_system = Mock(spec=RenderSystem)
-        self.mock_render_system._get_player_portrait_rect.return_value = pygame.Rect(100, 100, 100, 140)
-        
-        # Заставляем esper.get_processor возвращать наш мок
-        self.patcher = patch('esper.get_processor', return_value=self.mock_render_system)
-        self.mock_get_processor = self.patcher.start()
 
         self.chat_input = TextInput(
             rect=pygame.Rect(0, 0, 100, 30),
@@ -43,17 +35,17 @@ class TestInputSystem(unittest.TestCase):
         self.client_state.game_phase = "GAME_RUNNING"
         self.client_state.game_state_dict = {
             "players": {
-                "1": {"entity_id": 1, "hand": [], "board": []},
-                "2": {"entity_id": 2, "hand": [], "board": []}
+                1: {"entity_id": 1, "hand": [], "board": []},
+                2: {"entity_id": 2, "hand": [], "board": []}
             },
             "cards": {}
         }
+        self.client_state.opponent_id = 2 # Обычно выставляет StateUpdateSystem
         self.mock_font = Mock()
         self.mock_font.render.return_value = pygame.Surface((10, 10))
 
     def tearDown(self):
         """Очищает окружение после каждого теста."""
-        self.patcher.stop()
         esper.clear_database()
 
     def _create_card(self, entity_id, owner_id, location, card_type, pos=(10, 10), **card_props):
@@ -77,11 +69,11 @@ class TestInputSystem(unittest.TestCase):
         esper.add_component(entity_id, Clickable())
         
         # Добавляем данные в "представление" мира в client_state
-        self.client_state.game_state_dict["cards"][str(entity_id)] = card_data
+        self.client_state.game_state_dict["cards"][entity_id] = card_data
         if location == "HAND":
-            self.client_state.game_state_dict["players"][str(owner_id)]["hand"].append(entity_id)
+            self.client_state.game_state_dict["players"][owner_id]["hand"].append(entity_id)
         elif location == "BOARD":
-            self.client_state.game_state_dict["players"][str(owner_id)]["board"].append(entity_id)
+            self.client_state.game_state_dict["players"][owner_id]["board"].append(entity_id)
         
         return entity_id
 
@@ -98,6 +90,19 @@ class TestInputSystem(unittest.TestCase):
         
         self.assertIsNone(self.client_state.selected_entity)
 
+    @patch('pygame.mouse.get_pos')
+    @patch('pygame.event.get')
+    def test_hover_picks_top_card_when_cards_overlap(self, mock_event_get, mock_get_pos):
+        """Проверяет, что при наложении карт наведенной считается верхняя (с большим Y)."""
+        self._create_card(30, 1, "BOARD", "MINION", pos=(100, 300))
+        top_card = self._create_card(31, 1, "HAND", "MINION", pos=(130, 340))
+
+        mock_event_get.return_value = []
+        mock_get_pos.return_value = (150, 360)
+        self.input_system.process()
+
+        self.assertEqual(self.client_state.hovered_entity, top_card)
+
     @patch('pygame.event.get')
     def test_click_card_in_hand_sends_play_command(self, mock_event_get):
         """Проверяет, что клик по карте существа в руке в главной фазе отправляет команду PLAY_CARD."""
@@ -154,7 +159,7 @@ class TestInputSystem(unittest.TestCase):
         """Проверяет, что вызов declare_attackers отправляет команду и меняет фазу."""
         self.client_state.phase = GamePhase.COMBAT_DECLARE_ATTACKERS
         attacker_id = 12
-        self.client_state.pending_attackers = [attacker_id]
+        self.client_state.pending_attackers = {attacker_id}
 
         self.input_system.declare_attackers()
 
@@ -167,7 +172,7 @@ class TestInputSystem(unittest.TestCase):
     def test_declare_attackers_with_no_attackers_changes_phase_locally(self):
         """Проверяет, что объявление атаки без атакующих сразу меняет фазу на MAIN_2 без отправки команды."""
         self.client_state.phase = GamePhase.COMBAT_DECLARE_ATTACKERS
-        self.client_state.pending_attackers = []
+        self.client_state.pending_attackers = set()
 
         self.input_system.declare_attackers()
 
@@ -193,8 +198,9 @@ class TestInputSystem(unittest.TestCase):
         self.assertTrue(self.outgoing_queue.empty(), "Очередь должна быть пустой, карта должна быть выбрана")
         self.assertEqual(self.client_state.selected_entity, card_id)
 
+    @patch('pygame.mouse.get_pos')
     @patch('pygame.event.get')
-    def test_click_target_after_spell_selection_sends_command(self, mock_event_get):
+    def test_click_target_after_spell_selection_sends_command(self, mock_event_get, mock_get_pos):
         """Проверяет, что клик по цели после выбора заклинания в главной фазе отправляет команду."""
         self.client_state.phase = GamePhase.MAIN_1
         spell_id = self._create_card(
@@ -204,8 +210,8 @@ class TestInputSystem(unittest.TestCase):
         self.client_state.selected_entity = spell_id
         
         # Портрет оппонента - наша цель
-        opponent_portrait_pos = (150, 150)
-        self.mock_render_system._get_player_portrait_rect.return_value = pygame.Rect(opponent_portrait_pos[0], opponent_portrait_pos[1], 100, 140)
+        opponent_portrait_pos = get_player_indicator_rect(self.client_state, 2).center
+        mock_get_pos.return_value = opponent_portrait_pos
         
         mock_event_get.return_value = [
             pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=opponent_portrait_pos)
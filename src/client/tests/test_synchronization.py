@@ -27,7 +27,9 @@ class TestClientSynchronization(unittest.TestCase):
             incoming_q=self.incoming_queue,
             discovery_q=self.discovery_queue,
             font=self.mock_font,
-            client_state=self.client_state
+            client_state=self.client_state,
+            outgoing_q=queue.Queue(),
+            auto_mode=False
         )
         # Устанавливаем ID нашего игрока для тестов
         self.client_state.my_player_id = 1
@@ -43,13 +45,13 @@ class TestClientSynchronization(unittest.TestCase):
         # Подготовка: создаем тестовый словарь состояния, как будто он пришел от сервера
         server_state = {
             "players": {
-                "1": {"entity_id": 1, "health": 30, "hand": [3], "board": []},
-                "2": {"entity_id": 2, "health": 30, "hand": [4], "board": [5]}
+                1: {"entity_id": 1, "health": 30, "hand": [3], "board": []},
+                2: {"entity_id": 2, "health": 30, "hand": [4], "board": [5]}
             },
             "cards": {
-                "3": {"name": "My Goblin", "owner_id": 1, "location": "HAND", "type": "MINION"},
-                "4": {"name": "Opponent's Imp", "owner_id": 2, "location": "HAND", "type": "MINION"},
-                "5": {"name": "Opponent's Knight", "owner_id": 2, "location": "BOARD", "type": "MINION"}
+                3: {"name": "My Goblin", "owner_id": 1, "location": "HAND", "type": "MINION"},
+                4: {"name": "Opponent's Imp", "owner_id": 2, "location": "HAND", "type": "MINION"},
+                5: {"name": "Opponent's Knight", "owner_id": 2, "location": "BOARD", "type": "MINION"}
             },
             "active_player_id": 1
         }
@@ -86,10 +88,10 @@ class TestClientSynchronization(unittest.TestCase):
         """Проверяет, что синхронизация работает, даже если ID идут не по порядку (карта умерла)."""
         # Состояние, где карта с ID=4 отсутствует
         server_state = {
-            "players": {"1": {"entity_id": 1, "hand": [], "board": []}, "2": {"entity_id": 2, "hand": [], "board": []}},
+            "players": {1: {"entity_id": 1, "hand": [], "board": []}, 2: {"entity_id": 2, "hand": [], "board": []}},
             "cards": {
-                "3": {"name": "A", "owner_id": 1, "location": "BOARD"},
-                "5": {"name": "B", "owner_id": 2, "location": "BOARD"}
+                3: {"name": "A", "owner_id": 1, "location": "BOARD"},
+                5: {"name": "B", "owner_id": 2, "location": "BOARD"}
             },
         }
         self.state_update_system._synchronize_world(server_state)
@@ -98,6 +100,34 @@ class TestClientSynchronization(unittest.TestCase):
         self.assertTrue(esper.entity_exists(4), "Промежуточная сущность 4 должна быть создана")
         self.assertFalse(esper.has_component(4, Drawable), "Промежуточная сущность не должна быть видимой")
 
+    def test_synchronize_world_reuses_sprites_between_updates(self):
+        """Проверяет, что повторная синхронизация не пересоздает спрайты и снимает компоненты с ушедших карт."""
+        server_state = {
+            "players": {1: {"entity_id": 1, "hand": [3], "board": [4]}, 2: {"entity_id": 2, "hand": [], "board": []}},
+            "cards": {
+                3: {"name": "A", "owner_id": 1, "location": "HAND"},
+                4: {"name": "B", "owner_id": 1, "location": "BOARD"}
+            },
+        }
+        self.state_update_system._synchronize_world(server_state)
+        sprite = esper.component_for_entity(3, Drawable).sprite
+
+        # Карта 3 разыграна на стол, карта 4 ушла на кладбище
+        new_state = {
+            "players": server_state["players"],
+            "cards": {
+                3: {"name": "A", "owner_id": 1, "location": "BOARD"},
+                4: {"name": "B", "owner_id": 1, "location": "GRAVEYARD"}
+            },
+        }
+        self.state_update_system._synchronize_world(new_state)
+
+        self.assertIs(esper.component_for_entity(3, Drawable).sprite, sprite, "Спрайт карты должен переиспользоваться")
+        self.assertIs(sprite.card_data, new_state["cards"][3], "Спрайт должен видеть новые данные карты")
+        self.assertTrue(esper.entity_exists(4), "ID ушедшей карты должен остаться зарезервированным")
+        self.assertFalse(esper.has_component(4, Drawable))
+        self.assertFalse(esper.has_component(4, Position))
+
     def test_full_state_update_event_preserves_phase(self):
         """Проверяет, что FULL_STATE_UPDATE сбрасывает выбор, но СОХРАНЯЕТ фазу."""
         # Подготовка: устанавливаем состояние выбора и нестандартную фазу
@@ -117,6 +147,30 @@ class TestClientSynchronization(unittest.TestCase):
         self.assertIsNone(self.client_state.selected_blocker)
         self.assertEqual(self.client_state.phase, GamePhase.MAIN_2, "Фаза не должна сбрасываться при полном обновлении состояния")
 
+    def test_full_state_update_normalizes_keys_to_int(self):
+        """Проверяет, что FULL_STATE_UPDATE приводит строковые ключи JSON к int."""
+        event = {"type": "FULL_STATE_UPDATE", "payload": {
+            "players": {"1": {"entity_id": 1, "hand": [3], "board": []}},
+            "cards": {"3": {"name": "Goblin", "owner_id": 1, "location": "HAND"}},
+        }}
+        self.incoming_queue.put(event)
+        self.state_update_system.process()
+
+        self.assertIn(1, self.client_state.game_state_dict["players"])
+        self.assertIn(3, self.client_state.game_state_dict["cards"])
+        self.assertNotIn("3", self.client_state.game_state_dict["cards"])
+
+    def test_full_state_update_caches_opponent_id(self):
+        """Проверяет, что FULL_STATE_UPDATE запоминает ID оппонента в client_state."""
+        event = {"type": "FULL_STATE_UPDATE", "payload": {
+            "players": {"1": {"entity_id": 1}, "2": {"entity_id": 2}},
+            "cards": {},
+        }}
+        self.incoming_queue.put(event)
+        self.state_update_system.process()
+
+        self.assertEqual(self.client_state.opponent_id, 2)
+
     def test_action_error_event_adds_to_log(self):
         """Проверяет, что событие ACTION_ERROR добавляет сообщение в лог."""
         # Подготовка: помещаем событие в очередь
@@ -163,8 +217,8 @@ class TestClientSynchronization(unittest.TestCase):
         # Добавляем карты в состояние, чтобы их можно было изменить
         self.client_state.game_state_dict = {
             "cards": {
-                "10": {"name": "Attacker 1", "is_attacking": False},
-                "11": {"name": "Attacker 2", "is_attacking": False},
+                10: {"name": "Attacker 1", "is_attacking": False},
+                11: {"name": "Attacker 2", "is_attacking": False},
             }
         }
 
@@ -178,8 +232,8 @@ class TestClientSynchronization(unittest.TestCase):
         self.assertIsNone(self.client_state.selected_blocker)
         self.assertEqual(self.client_state.block_assignments, {})
         # Проверяем, что флаг атаки установлен
-        self.assertTrue(self.client_state.game_state_dict["cards"]["10"]["is_attacking"])
-        self.assertTrue(self.client_state.game_state_dict["cards"]["11"]["is_attacking"])
+        self.assertTrue(self.client_state.game_state_dict["cards"][10]["is_attacking"])
+        self.assertTrue(self.client_state.game_state_dict["cards"][11]["is_attacking"])
 
     def test_combat_resolved_event_sets_phase_to_main_2(self):
         """Проверяет, что событие COMBAT_RESOLVED устанавливает фазу MAIN_2 и сбрасывает состояние боя."""
@@ -191,8 +245,8 @@ class TestClientSynchronization(unittest.TestCase):
         # Добавляем карты в состояние, чтобы их можно было изменить
         self.client_state.game_state_dict = {
             "cards": {
-                "10": {"name": "Attacker 1", "is_attacking": True},
-                "11": {"name": "Attacker 2", "is_attacking": True},
+                10: {"name": "Attacker 1", "is_attacking": True},
+                11: {"name": "Attacker 2", "is_attacking": True},
             }
         }
 
@@ -205,20 +259,20 @@ class TestClientSynchronization(unittest.TestCase):
         self.assertIsNone(self.client_state.selected_blocker)
         self.assertEqual(self.client_state.block_assignments, {})
         # Проверяем, что флаг атаки сброшен
-        self.assertFalse(self.client_state.game_state_dict["cards"]["10"]["is_attacking"])
-        self.assertFalse(self.client_state.game_state_dict["cards"]["11"]["is_attacking"])
+        self.assertFalse(self.client_state.game_state_dict["cards"][10]["is_attacking"])
+        self.assertFalse(self.client_state.game_state_dict["cards"][11]["is_attacking"])
 
     def test_turn_started_event_resets_phase_to_main_1(self):
         """Проверяет, что событие TURN_STARTED сбрасывает фазу в MAIN_1."""
         self.client_state.phase = GamePhase.MAIN_2
-        self.client_state.pending_attackers = [123] # some dummy data
+        self.client_state.pending_attackers = {123} # some dummy data
 
         event = {"type": "TURN_STARTED", "payload": {"player_id": 1}}
         self.incoming_queue.put(event)
         self.state_update_system.process()
 
         self.assertEqual(self.client_state.phase, GamePhase.MAIN_1)
-        self.assertEqual(self.client_state.pending_attackers, [])
+        self.assertEqual(self.client_state.pending_attackers, set())
 
     def test_player_damaged_event_updates_health_and_queues_animation(self):
         """Проверяет, что PLAYER_DAMAGED обновляет здоровье и добавляет анимацию."""
@@ -226,7 +280,7 @@ class TestClientSynchronization(unittest.TestCase):
         player_entity_id = 2
         self.client_state.game_state_dict = {
             "players": {
-                str(player_entity_id): {"entity_id": player_entity_id, "health": 30}
+                player_entity_id: {"entity_id": player_entity_id, "health": 30}
             }
         }
 
@@ -235,17 +289,35 @@ class TestClientSynchronization(unittest.TestCase):
         self.state_update_system.process()
 
         # Проверка: здоровье должно обновиться в локальном состоянии
-        updated_health = self.client_state.game_state_dict["players"][str(player_entity_id)]["health"]
+        updated_health = self.client_state.game_state_dict["players"][player_entity_id]["health"]
         self.assertEqual(updated_health, 25)
 
         # Проверка: событие должно быть добавлено в очередь анимаций
         self.assertEqual(len(self.client_state.animation_queue), 1)
         self.assertEqual(self.client_state.animation_queue[0], event)
 
+    def test_card_attacked_event_patches_both_combatants(self):
+        """Проверяет, что CARD_ATTACKED обновляет здоровье атакующего и цели по PATCH_RULES."""
+        self.client_state.game_state_dict = {
+            "players": {},
+            "cards": {5: {"name": "Orc", "health": 3}, 6: {"name": "Elf", "health": 2}}
+        }
+
+        event = {"type": "CARD_ATTACKED", "payload": {
+            "attacker_id": 5, "attacker_new_health": 1, "target_id": 6, "target_new_health": 0
+        }}
+        self.incoming_queue.put(event)
+        self.state_update_system.process()
+
+        cards = self.client_state.game_state_dict["cards"]
+        self.assertEqual(cards[5]["health"], 1)
+        self.assertEqual(cards[6]["health"], 0)
+        self.assertEqual(self.client_state.animation_queue[-1], event)
+
     def test_card_died_event_queues_animation_and_logs(self):
         """Проверяет, что CARD_DIED добавляет анимацию в очередь и сообщение в лог."""
         card_id_to_die = 15
-        self.client_state.game_state_dict = {"cards": {str(card_id_to_die): {"name": "Goblin"}}}
+        self.client_state.game_state_dict = {"cards": {card_id_to_die: {"name": "Goblin"}}}
 
         event = {"type": "CARD_DIED", "payload": {"card_id": card_id_to_die}}
         self.incoming_queue.put(event)
@@ -253,4 +325,18 @@ class TestClientSynchronization(unittest.TestCase):
 
         self.assertEqual(len(self.client_state.animation_queue), 1)
         self.assertEqual(self.client_state.animation_queue[0], event)
-        self.assertIn("'Goblin' уничтожена.", self.client_state.log_messages[0])
\ No newline at end of file
+        self.assertIn("'Goblin' уничтожена.", self.client_state.log_messages[0])
+
+    def test_card_drawn_event_adds_card_to_hand_once(self):
+        """Проверяет, что CARD_DRAWN добавляет карту в руку без дублей и обновляет hand_set."""
+        player_data = {"entity_id": 1, "hand": [3], "hand_set": {3}, "board": []}
+        self.client_state.game_state_dict = {"players": {1: player_data}, "cards": {}}
+
+        card_data = {"name": "Goblin", "owner_id": 1, "location": "HAND"}
+        for _ in range(2):
+            event = {"type": "CARD_DRAWN", "payload": {"player_id": 1, "card_id": 7, "card_data": card_data}}
+            self.incoming_queue.put(event)
+        self.state_update_system.process()
+
+        self.assertEqual(player_data["hand"], [3, 7])
+        self.assertEqual(player_data["hand_set"], {3, 7})
@@ -46,7 +46,7 @@ class TestUIAndFlow(unittest.TestCase):
             self.outgoing_queue, self.client_state, self.ui_manager, self.chat_input
         )
         self.state_update_system = StateUpdateSystem(
-            queue.Queue(), self.discovery_queue, self.mock_font, self.client_state
+            queue.Queue(), self.discovery_queue, self.mock_font, self.client_state, self.outgoing_queue, False
         )
 
         esper.add_processor(self.ui_setup_system)
@@ -70,6 +70,18 @@ class TestUIAndFlow(unittest.TestCase):
         self.assertIn("Присоединиться к игре", button_texts)
         self.assertIn("Выход", button_texts)
 
+    def test_ui_is_rebuilt_only_when_state_changes(self):
+        """Проверяет, что кнопки переиспользуются между кадрами, пока состояние не меняется."""
+        esper.process()
+        first_buttons = list(self.ui_manager.elements)
+
+        esper.process()
+        self.assertEqual([id(el) for el in self.ui_manager.elements], [id(el) for el in first_buttons])
+
+        self.client_state.game_phase = "SERVER_BROWSER"
+        esper.process()
+        self.assertNotIn(first_buttons[0], self.ui_manager.elements)
+
     def test_join_game_button_switches_to_server_browser(self):
         """Проверяет, что нажатие кнопки 'Присоединиться' переключает фазу на поиск серверов."""
         esper.process() # Создаем кнопки главного меню
@@ -39,11 +39,13 @@ class UIElement:
 
 class Label(UIElement):
     """Элемент для отображения текста."""
-    def __init__(self, text: str, pos: Tuple[int, int], font: pygame.font.Font, color: Tuple[int, int, int] = LABEL_COLOR, center: bool = True):
+    def __init__(self, text: str, pos: Tuple[int, int], font: pygame.font.Font, color: Tuple[int, int, int] = LABEL_COLOR, center: bool = True,
+                 image: Optional[pygame.Surface] = None):
         self.text = text
         self.font = font
         self.color = color
-        self.image = self.font.render(self.text, True, self.color)
+        # Можно передать заранее отрисованную поверхность, чтобы не рендерить текст заново
+        self.image = image if image is not None else self.font.render(self.text, True, self.color)
         
         rect = self.image.get_rect()
         if center:
@@ -59,11 +61,13 @@ class Label(UIElement):
 class Button(UIElement):
     """Кликабельная кнопка с текстом."""
     def __init__(self, text: str, rect: pygame.Rect, font: pygame.font.Font, callback: Callable, 
-                 bg_color=BUTTON_COLOR, hover_color=BUTTON_HOVER_COLOR, pressed_color=BUTTON_PRESSED_COLOR, text_color=BUTTON_TEXT_COLOR):
+                 bg_color=BUTTON_COLOR, hover_color=BUTTON_HOVER_COLOR, pressed_color=BUTTON_PRESSED_COLOR, text_color=BUTTON_TEXT_COLOR,
+                 text_image: Optional[pygame.Surface] = None):
         super().__init__(rect)
         self.text = text
         self.font = font
         self.callback = callback
+        self.text_image = text_image # Заранее отрисованный текст (опционально)
         
         self.colors = {
             'normal': bg_color,
@@ -83,7 +87,9 @@ class Button(UIElement):
             color = self.colors['hover']
 
         pygame.draw.rect(screen, color, self.rect)
-        text_surf = self.font.render(self.text, True, self.text_color)
+        text_surf = self.text_image
+        if text_surf is None:
+            text_surf = self.font.render(self.text, True, self.text_color)
         text_rect = text_surf.get_rect(center=self.rect.center)
         screen.blit(text_surf, text_rect)
 